@@ -0,0 +1,65 @@
+"""
+Benchmark: time and file size of each output compression profile.
+
+Renders the same guests with every profile in COMPRESSION_PROFILES and
+reports the time per guest and the bytes per invitation, so the profile can
+be picked per job (e.g. "fast" for proofs, "smallest" for e-mail batches).
+The overlay cache is off so every name is really rendered.
+
+Usage:
+    python bench_compression.py template.pdf font.ttf --position 1,120,340,26 \\
+        [--engine pillow] [--guests 20]
+"""
+import argparse
+import statistics
+import time
+
+from invitation_cli import parse_position
+from invitation_engine import COMPRESSION_PROFILES, InvitationEngine
+from renderers import RENDERERS
+
+SAMPLE_NAMES = [
+    "શ્રી રાજેશભાઈ પટેલ",
+    "શ્રીમતી કૃષ્ણાબેન શાહ",
+    "શ્રી ક્ષિતિજ દ્વિવેદી",
+    "શ્રી પ્રદીપભાઈ વાઘેલા",
+]
+
+
+def measure(engine, guest_names):
+    """Return (per-guest times in ms, bytes per invitation)"""
+    times = []
+    sizes = []
+    for guest_name in guest_names:
+        start = time.perf_counter()
+        pdf_bytes = engine.render_bytes(guest_name)
+        times.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(pdf_bytes))
+    return times, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare output compression profiles.")
+    parser.add_argument("template", help="PDF invitation template")
+    parser.add_argument("font", help="Gujarati TrueType font (.ttf)")
+    parser.add_argument("--position", dest="positions", type=parse_position, action="append",
+                        required=True, help="name position as PAGE,X,Y,SIZE (repeatable)")
+    parser.add_argument("--engine", default="pillow", choices=sorted(RENDERERS),
+                        help="text renderer (default: pillow)")
+    parser.add_argument("--guests", type=int, default=20, help="guests per profile (default: 20)")
+    args = parser.parse_args()
+
+    guest_names = [f"{SAMPLE_NAMES[i % len(SAMPLE_NAMES)]} {i}" for i in range(args.guests)]
+
+    print(f"{'profile':<12}{'ms/guest':>10}{'median ms':>12}{'KB/guest':>10}")
+    for compression in COMPRESSION_PROFILES:
+        engine = InvitationEngine(args.template, args.font, args.positions,
+                                  engine=args.engine, compression=compression,
+                                  overlay_cache=False)
+        times, sizes = measure(engine, guest_names)
+        print(f"{compression:<12}{statistics.mean(times):>10.1f}{statistics.median(times):>12.1f}"
+              f"{statistics.mean(sizes) / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Benchmark: throughput, latency, memory and output size of every text engine.
+
+Builds synthetic templates locally (a 1-page card, a 4-page card and a
+photo-heavy page) and a seeded list of Gujarati names with a realistic share
+of conjuncts (શ્રી, ક્ષ, ત્ર, દ્વ, ...), then runs every engine in RENDERERS on
+each template, each case in a fresh process so peak memory is its own.
+Reported per case:
+
+- per-guest latency percentiles (render_bytes, one guest at a time)
+- guests/sec for a whole batch through InvitationEngine.generate(), so
+  engines that batch their layout (WeasyPrint, native) get the benefit
+- output bytes per guest and peak RSS
+- milliseconds per guest in each stage of the batch (see timing.py)
+
+Results are written to a JSON file; pass an earlier file with --compare to
+see how a change moved the numbers. Engines that cannot load here (e.g.
+WeasyPrint without Pango) are reported as skipped. The overlay cache is off
+so every name is really rendered.
+
+Usage:
+    python bench_engines.py font.ttf [--engines pillow native] [--guests 200] \\
+        [--output bench_engines.json] [--compare baseline.json]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import fitz  # PyMuPDF
+import PIL
+import PIL.features
+
+from PIL import Image
+
+from invitation_engine import InvitationEngine
+from overlay_cache import file_digest
+from renderers import RENDERERS
+from timing import TimingReport
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Bump when the cases or the way they are measured change
+BENCH_VERSION = 1
+
+# Building blocks for synthetic names
+CONSONANTS = "કખગઘચછજઝટડણતથદધનપફબભમયરલવશષસહ"
+VOWEL_SIGNS = ["", "", "", "ા", "િ", "ી", "ુ", "ે", "ૈ", "ો", "ં"]
+CONJUNCTS = ["ક્ષ", "જ્ઞ", "શ્ર", "ત્ર", "દ્ર", "દ્વ", "પ્ર", "ક્ર", "સ્ત", "સ્વ",
+             "ન્દ", "ન્ત", "ર્મ", "ર્ય", "ધ્ય", "શ્વ", "ષ્ણ", "ક્ત"]
+HONORIFICS = ["શ્રી", "શ્રી", "શ્રીમતી", "કુ.", "ડૉ."]
+NAME_SUFFIXES = ["ભાઈ", "બેન", "", ""]
+SURNAMES = ["પટેલ", "શાહ", "ત્રિવેદી", "દ્વિવેદી", "દેસાઈ", "વ્યાસ", "જોષી", "મહેતા",
+            "પંડ્યા", "ભટ્ટ", "ચૌહાણ", "વાઘેલા", "મિસ્ત્રી", "ઠક્કર"]
+
+# Share of given-name syllables that are conjuncts
+CONJUNCT_SHARE = 0.25
+
+VIRAMA = "્"
+
+
+def make_names(count, seed=1, conjunct_share=CONJUNCT_SHARE):
+    """`count` distinct Gujarati guest names, the same ones for the same seed"""
+    rng = random.Random(seed)
+    names = []
+    seen = set()
+    while len(names) < count:
+        syllables = []
+        for _ in range(rng.randint(2, 3)):
+            if rng.random() < conjunct_share:
+                syllables.append(rng.choice(CONJUNCTS))
+            else:
+                syllables.append(rng.choice(CONSONANTS))
+            syllables.append(rng.choice(VOWEL_SIGNS))
+        given = "".join(syllables) + rng.choice(NAME_SUFFIXES)
+        name = f"{rng.choice(HONORIFICS)} {given} {rng.choice(SURNAMES)}"
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def decorate_page(page, title):
+    """Border, headings and ornaments standing in for a printed card"""
+    rect = page.rect
+    page.draw_rect(rect + (20, 20, -20, -20), color=(0.6, 0.1, 0.1), width=3)
+    page.draw_rect(rect + (28, 28, -28, -28), color=(0.8, 0.6, 0.2), width=1)
+    page.insert_text((60, 100), title, fontsize=28, fontname="helv", color=(0.6, 0.1, 0.1))
+    for line in range(12):
+        page.insert_text((60, 480 + line * 18), "Lorem ipsum dolor sit amet, consectetur "
+                         "adipiscing elit, sed do eiusmod tempor.", fontsize=10, fontname="helv")
+    for corner in (rect.tl + (60, 60), rect.tr + (-60, 60), rect.bl + (60, -60), rect.br + (-60, -60)):
+        page.draw_circle(corner, 18, color=(0.8, 0.6, 0.2), fill=(1, 0.95, 0.8))
+
+
+def build_card(path, pages):
+    doc = fitz.open()
+    for page_num in range(pages):
+        decorate_page(doc.new_page(width=595, height=842), f"Wedding Invitation - page {page_num + 1}")
+    doc.save(path, garbage=1, deflate=True)
+    doc.close()
+
+
+def build_photo(path, seed=1):
+    """A page covered by a 300 dpi, photo-like JPEG (smooth shapes plus grain)"""
+    rng = random.Random(seed)
+    width, height = 2480, 3508
+    coarse_size = (width // 40, height // 40)
+    grain_size = (width // 4, height // 4)
+    coarse = Image.frombytes("RGB", coarse_size, rng.randbytes(coarse_size[0] * coarse_size[1] * 3))
+    grain = Image.frombytes("L", grain_size, rng.randbytes(grain_size[0] * grain_size[1]))
+    photo = coarse.resize((width, height), Image.Resampling.BICUBIC)
+    photo = Image.blend(photo, grain.convert("RGB").resize((width, height)), 0.15)
+    buffer = io.BytesIO()
+    photo.save(buffer, format="JPEG", quality=90)
+
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=buffer.getvalue())
+    page.insert_text((60, 100), "Wedding Invitation", fontsize=28, fontname="helv", color=(1, 1, 1))
+    doc.save(path, garbage=1, deflate=True)
+    doc.close()
+
+
+# name -> (builder(path, seed), name positions as (page, x, y, font size))
+TEMPLATES = {
+    "card_1page": (lambda path, seed: build_card(path, 1), [(0, 150, 380, 28)]),
+    "card_4page": (lambda path, seed: build_card(path, 4), [(0, 150, 380, 28), (2, 120, 300, 24)]),
+    "photo": (build_photo, [(0, 150, 380, 32)]),
+}
+
+
+def percentiles(values):
+    """p50/p90/p99/mean/max of a list of milliseconds"""
+    cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+    return {
+        "p50": round(cuts[49], 3),
+        "p90": round(cuts[89], 3),
+        "p99": round(cuts[98], 3),
+        "mean": round(statistics.mean(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(engine_name, template_name, template_path, font_path, positions, names,
+             latency_guests, rendering):
+    """Measure one engine on one template (runs in its own process)"""
+    result = {"engine": engine_name, "template": template_name, "rendering": rendering}
+    try:
+        engine = InvitationEngine(template_path, font_path, positions, engine=engine_name,
+                                  rendering=rendering, overlay_cache=False)
+        # Fonts, layout engines and lazy imports load on the first guest
+        engine.render_bytes(names[0])
+    except Exception as e:
+        result.update(status="skipped", reason=f"{type(e).__name__}: {e}")
+        return result
+
+    latencies = []
+    for guest_name in names[:latency_guests]:
+        start = time.perf_counter()
+        engine.render_bytes(guest_name)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    timings = TimingReport()
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        output_paths = engine.generate(names, output_dir, resume=False, on_stage_times=timings.add)
+        elapsed = time.perf_counter() - start
+        sizes = [os.path.getsize(path) for path in output_paths if path is not None]
+
+    result.update(
+        status="ok",
+        guests=len(names),
+        latency_ms=percentiles(latencies),
+        guests_per_sec=round(len(names) / elapsed, 2),
+        bytes_per_guest=round(statistics.mean(sizes)),
+        peak_rss_mb=peak_rss_mb(),
+        stage_ms_per_guest={path: round(seconds * 1000 / len(names), 3)
+                            for path, (seconds, _) in timings.stages.items()},
+    )
+    return result
+
+
+def environment(font_path, names, args):
+    return {
+        "bench_version": BENCH_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pymupdf": fitz.VersionBind,
+        "pillow": PIL.__version__,
+        "raqm": bool(PIL.features.check_feature("raqm")),
+        "font": os.path.basename(font_path),
+        "font_sha256": file_digest(font_path),
+        "seed": args.seed,
+        "guests": len(names),
+        "latency_guests": min(args.latency_guests, len(names)),
+        "conjuncts_per_name": round(sum(name.count(VIRAMA) for name in names) / len(names), 2),
+    }
+
+
+def print_results(results):
+    print(f"\n{'engine':<12}{'template':<12}{'guests/s':>10}{'p50 ms':>9}{'p90 ms':>9}"
+          f"{'p99 ms':>9}{'KB/guest':>10}{'RSS MB':>8}")
+    for result in results:
+        label = f"{result['engine']:<12}{result['template']:<12}"
+        if result["status"] != "ok":
+            print(f"{label}skipped: {result['reason'][:60]}")
+            continue
+        latency = result["latency_ms"]
+        rss = result["peak_rss_mb"]
+        print(f"{label}{result['guests_per_sec']:>10.1f}{latency['p50']:>9.1f}{latency['p90']:>9.1f}"
+              f"{latency['p99']:>9.1f}{result['bytes_per_guest'] / 1024:>10.1f}"
+              f"{rss if rss is not None else '-':>8}")
+
+
+def change(old, new):
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(baseline, report):
+    """Print how each case moved relative to an earlier report"""
+    for key in ("pymupdf", "pillow", "raqm", "font_sha256", "cpu_count", "guests"):
+        if baseline["environment"].get(key) != report["environment"].get(key):
+            print(f"note: {key} differs from the baseline "
+                  f"({baseline['environment'].get(key)} -> {report['environment'].get(key)})")
+
+    old_results = {(result["engine"], result["template"]): result
+                   for result in baseline["results"] if result["status"] == "ok"}
+    print(f"\n{'engine':<12}{'template':<12}{'guests/s':>10}{'p50':>10}{'p99':>10}"
+          f"{'bytes':>10}{'RSS':>10}")
+    for result in report["results"]:
+        old = old_results.get((result["engine"], result["template"]))
+        if old is None or result["status"] != "ok":
+            continue
+        rss = (change(old["peak_rss_mb"], result["peak_rss_mb"])
+               if old["peak_rss_mb"] and result["peak_rss_mb"] else "n/a")
+        print(f"{result['engine']:<12}{result['template']:<12}"
+              f"{change(old['guests_per_sec'], result['guests_per_sec']):>10}"
+              f"{change(old['latency_ms']['p50'], result['latency_ms']['p50']):>10}"
+              f"{change(old['latency_ms']['p99'], result['latency_ms']['p99']):>10}"
+              f"{change(old['bytes_per_guest'], result['bytes_per_guest']):>10}{rss:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every text engine on synthetic templates.")
+    parser.add_argument("font", help="Gujarati TrueType font (.ttf)")
+    parser.add_argument("--engines", nargs="+", choices=sorted(RENDERERS), default=sorted(RENDERERS),
+                        help="engines to run (default: all)")
+    parser.add_argument("--templates", nargs="+", choices=list(TEMPLATES), default=list(TEMPLATES),
+                        help="synthetic templates to run (default: all)")
+    parser.add_argument("--rendering", choices=["normal", "quality"], default="normal",
+                        help="rendering quality passed to every engine (default: normal)")
+    parser.add_argument("--guests", type=int, default=200,
+                        help="guests per batch for guests/sec and size (default: 200)")
+    parser.add_argument("--latency-guests", type=int, default=50,
+                        help="guests timed one by one for latency percentiles (default: 50)")
+    parser.add_argument("--seed", type=int, default=1, help="seed for names and photos (default: 1)")
+    parser.add_argument("--output", default="bench_engines.json",
+                        help="JSON report to write (default: bench_engines.json)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    names = make_names(max(args.guests, 1), args.seed)
+    report = {"environment": environment(args.font, names, args), "results": []}
+
+    # spawn: every case starts from a fresh interpreter, so peak RSS is its own
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as template_dir:
+        for template_name in args.templates:
+            build, positions = TEMPLATES[template_name]
+            template_path = os.path.join(template_dir, f"{template_name}.pdf")
+            build(template_path, args.seed)
+
+            for engine_name in args.engines:
+                print(f"{engine_name} on {template_name}...", flush=True)
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_case, engine_name, template_name, template_path,
+                                             args.font, positions, names, args.latency_guests,
+                                             args.rendering).result()
+                result["template_bytes"] = os.path.getsize(template_path)
+                report["results"].append(result)
+
+    print_results(report["results"])
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: start-up import time of the GUIs and the CLI.
+
+Loads each entry script in a fresh interpreter with `python -X importtime`
+(without running its main()), several times, and reports the fastest total
+import time together with the slowest modules the script imports directly.
+PyMuPDF, Pillow and the text engines are meant to load on first use, or in
+the background once the window is up, so the GUIs must not import them at
+start-up at all.
+
+Exits with status 1 when a script goes over its time budget or imports a
+module it should not, so the check can run in CI.
+
+Usage:
+    python bench_startup.py [--runs 5] [--top 8] [--budget-scale 1.0] [script ...]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Script -> (import time budget in ms, modules it must not import at start-up)
+GUI_DEFERRED = ("fitz", "pymupdf", "PIL", "weasyprint", "reportlab", "PyPDF2",
+                "invitation_engine", "renderers")
+SCRIPTS = {
+    "pdfautomator.py": (60, GUI_DEFERRED),
+    "lekhak_gui.py.py": (60, GUI_DEFERRED),
+    "invitation_cli.py": (400, ("tkinter", "weasyprint", "reportlab", "PyPDF2")),
+}
+
+# Runs the script's top level only; main() is behind `if __name__ == "__main__"`
+LOADER = "import runpy, sys; runpy.run_path(sys.argv[1], run_name='__startup_bench__')"
+
+# Imported by run_path itself rather than by the script
+LOADER_IMPORTS = ("pkgutil",)
+
+
+def parse_importtime(stderr):
+    """
+    Return [(module, self_us, cumulative_us, depth)] for everything imported
+    after the loader started, i.e. by the script rather than by site.py
+    """
+    entries = []
+    started = False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        if not started:
+            started = module == "runpy"
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and module in LOADER_IMPORTS:
+            continue
+        entries.append((module, int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure(script, runs):
+    """Fastest of `runs` start-ups: (total ms, entries of that run)"""
+    best = None
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", LOADER, script],
+                                   capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(script)))
+        if completed.returncode != 0:
+            raise RuntimeError(f"{script} failed to load:\n{completed.stderr[-2000:]}")
+        entries = parse_importtime(completed.stderr)
+        total_ms = sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000
+        if best is None or total_ms < best[0]:
+            best = (total_ms, entries)
+    return best
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Check start-up import time against a budget.")
+    parser.add_argument("scripts", nargs="*", default=list(SCRIPTS),
+                        help="entry scripts to check (default: the GUIs and the CLI)")
+    parser.add_argument("--runs", type=int, default=5, help="start-ups per script, fastest counts (default: 5)")
+    parser.add_argument("--top", type=int, default=8, help="slowest direct imports to list (default: 8)")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="multiply every time budget, e.g. 2 on slow CI machines (default: 1.0)")
+    args = parser.parse_args()
+
+    failed = False
+    for script in args.scripts:
+        budget_ms, deferred = SCRIPTS.get(os.path.basename(script), (None, ()))
+        path = script if os.path.exists(script) else os.path.join(here, script)
+        total_ms, entries = measure(path, max(1, args.runs))
+
+        status = "ok"
+        if budget_ms is not None and total_ms > budget_ms * args.budget_scale:
+            status = "OVER BUDGET"
+            failed = True
+        budget = f" (budget {budget_ms * args.budget_scale:.0f} ms)" if budget_ms is not None else ""
+        print(f"\n{script}: {total_ms:.1f} ms{budget} {status}")
+
+        direct = sorted((entry for entry in entries if entry[3] == 0), key=lambda entry: -entry[2])
+        for module, _, cumulative_us, _ in direct[:args.top]:
+            print(f"  {cumulative_us / 1000:>8.1f} ms  {module}")
+
+        loaded = sorted({module for module, _, _, _ in entries
+                         if module.split(".")[0] in deferred})
+        if loaded:
+            failed = True
+            print(f"  should load on first use: {', '.join(loaded)}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Benchmark: per-guest cost of opening the invitation template.
+
+Compares re-opening the template file from disk for every guest (the old
+behaviour) with opening each copy from bytes loaded once, as
+InvitationEngine now does. Each open also loads every page, so the cost of
+parsing the template is included.
+
+Usage:
+    python bench_template_open.py template.pdf [--guests 500]
+"""
+import argparse
+import statistics
+import time
+
+import fitz  # PyMuPDF
+
+
+def open_from_file(pdf_path, _data):
+    return fitz.open(pdf_path)
+
+
+def open_from_bytes(_pdf_path, data):
+    return fitz.open("pdf", data)
+
+
+def measure(open_template, pdf_path, data, guests):
+    """Return per-guest open times in milliseconds"""
+    times = []
+    for _ in range(guests):
+        start = time.perf_counter()
+        doc = open_template(pdf_path, data)
+        for page in doc:
+            page.get_contents()
+        doc.close()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time opening the template once per guest.")
+    parser.add_argument("template", help="PDF invitation template")
+    parser.add_argument("--guests", type=int, default=500, help="opens per method (default: 500)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.template, 'rb') as f:
+        data = f.read()
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"Template: {args.template} ({len(data) / 1024:.0f} KB, read once in {load_ms:.1f} ms)")
+
+    print(f"\n{'method':<12}{'mean ms':>10}{'median ms':>12}{'total s':>10}")
+    for label, open_template in (("file", open_from_file), ("bytes", open_from_bytes)):
+        times = measure(open_template, args.template, data, args.guests)
+        print(f"{label:<12}{statistics.mean(times):>10.3f}{statistics.median(times):>12.3f}"
+              f"{sum(times) / 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
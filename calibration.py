@@ -0,0 +1,359 @@
+"""
+Automatic choice of text engine (engine="auto").
+
+A short calibration on the actual font and template: the font must have
+glyphs for every probe character, and every registered engine first lays
+out a few conjuncts (ક્ષ, જ્ઞ, શ્રી, ...). An engine is only accepted when it draws
+them with the chosen font rather than a fallback, they come out as
+conjuncts and a sample name lands where the font's metrics put it; it
+then renders a handful of sample guests onto the first page of the
+template. The fastest accepted engine wins. The outcome, with each
+engine's timings, is recorded in a JSON file keyed by the template, font
+and settings (not the name positions, so placing names does not call for
+a new calibration), and later runs and resumed batches use the same
+engine without calibrating again.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+
+import fitz  # PyMuPDF
+
+from PIL import Image, ImageDraw, ImageFont
+
+from invitation_engine import InvitationEngine, save_options
+from overlay_cache import default_cache_dir, file_digest
+from renderers import RENDERERS, create_renderer
+
+CALIBRATION_NAME = "calibration.json"
+
+# Bump when the calibration changes in a way that should redo old records
+CALIBRATION_VERSION = 5
+
+# Conjunct -> the same consonants without the virama. A shaped conjunct is
+# one (narrower) glyph; unshaped text shows the consonants side by side with
+# a separate virama and comes out at least as wide as the plain pair.
+SHAPING_PROBES = (
+    ("ક્ષ", "કષ"),
+    ("જ્ઞ", "જઞ"),
+    ("શ્રી", "શરી"),
+    ("દ્ધ", "દધ"),
+    ("ત્ર", "તર"),
+)
+
+# A conjunct must be narrower than this share of its plain pair
+CONJUNCT_WIDTH_RATIO = 0.85
+
+PROBE_FONT_SIZE = 48
+
+# Consonants only, so the expected box of the name does not depend on shaping
+PLACEMENT_PROBE = "કમલ નયન"
+
+# (x, y, font_size) the placement probe is drawn at
+PLACEMENT_POSITION = (100, 200, 32)
+
+# Largest allowed distance in points of an edge of the drawn name from
+# where the font puts it: about a point, plus the half point an edge pixel
+# of a 72 dpi image overlay can add
+PLACEMENT_TOLERANCE = 1.5
+
+# Zoom the placement probe is rasterised at
+PLACEMENT_ZOOM = 4
+
+# Guests rendered (as one batch) per timing round
+SAMPLE_NAMES = (
+    "શ્રી રાજેશભાઈ પટેલ",
+    "શ્રીમતી સીતાબેન શાહ",
+    "શ્રી ક્ષિતિજ દેસાઈ",
+    "શ્રી જ્ઞાનેશ્વર ત્રિવેદી",
+    "શ્રીમતી પ્રજ્ઞા મહેતા",
+    "શ્રી સિદ્ધાર્થ જોશી",
+    "શ્રી કૃષ્ણકાંત ભટ્ટ",
+    "શ્રીમતી સ્મિતાબેન વ્યાસ",
+)
+
+# The sample guests are timed with one name at the placement probe's position
+TIMING_POSITIONS = ((0, *PLACEMENT_POSITION),)
+
+# Timing rounds after a warm-up render; the fastest counts
+CALIBRATION_ROUNDS = 2
+
+
+def default_calibration_path():
+    """Calibration records kept next to the overlay cache"""
+    return os.path.join(default_cache_dir(), CALIBRATION_NAME)
+
+
+def probe_characters():
+    """Every character the calibration draws, besides spaces"""
+    texts = [text for probe in SHAPING_PROBES for text in probe] + [PLACEMENT_PROBE, *SAMPLE_NAMES]
+    return sorted(set("".join(texts)) - {" "})
+
+
+def missing_glyphs(font_path):
+    """Probe characters the font at `font_path` has no glyph for"""
+    font = fitz.Font(fontfile=font_path)
+    return [char for char in probe_characters() if not font.has_glyph(ord(char))]
+
+
+def font_names(font_path):
+    """Names a PDF may give the font at `font_path`, normalised by normalise_font_name()"""
+    family, style = ImageFont.truetype(font_path).getname()
+    # Full name, family plus style, or a PostScript name without a style
+    return {normalise_font_name(fitz.Font(fontfile=font_path).name),
+            normalise_font_name(f"{family} {style}"), normalise_font_name(family)}
+
+
+def normalise_font_name(name):
+    """Font name without a subset tag ("ABCDEF+"), case, spaces or dashes"""
+    return re.sub(r"[^0-9a-z]", "", re.sub(r"^[A-Z]{6}\+", "", name).lower())
+
+
+def check_font_used(engine, font_path, rendering="normal"):
+    """
+    Return the fonts other than the one at `font_path` that `engine` draws
+    the probe characters with, e.g. a fallback font standing in for the
+    chosen one or a font file that failed to load. Checked on vector
+    output, where the fonts are visible; engines without vector output
+    draw with the font file directly and return no fonts.
+    """
+    if "vector" not in RENDERERS[engine].overlays:
+        return []
+    renderer = create_renderer(engine, font_path, rendering, "vector")
+    doc = fitz.open()
+    try:
+        width, height = fitz.paper_size("a4")
+        doc.new_page(width=width, height=height)
+        # A line per probe keeps every character on the page
+        for line, text in enumerate(["".join(probe_characters()), *SAMPLE_NAMES]):
+            renderer.add_text_to_document(doc, text, [(0, 20, 20 + line * 24, 16)], (0, 0, 0, 255))
+        used = {font[3] for font in doc[0].get_fonts(full=True)}
+    finally:
+        doc.close()
+    expected = font_names(font_path)
+    return sorted(name for name in used if normalise_font_name(name) not in expected)
+
+
+def calibration_key(template_data, font_path, rendering="normal", overlay=None,
+                    compression="balanced"):
+    """Hash of everything a calibration depends on, including the registered engines"""
+    digest = hashlib.sha256(template_data)
+    digest.update(file_digest(font_path).encode("ascii"))
+    settings = (CALIBRATION_VERSION, rendering, overlay, compression, sorted(RENDERERS))
+    digest.update(repr(settings).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def ink_box(renderer, text, x, y, font_size, zoom=1):
+    """Box in points of what `renderer` draws for `text` at (x, y) on a blank A4 page, or None"""
+    doc = fitz.open()
+    try:
+        width, height = fitz.paper_size("a4")
+        doc.new_page(width=width, height=height)
+        renderer.add_text_to_document(doc, text, [(0, x, y, font_size)], (0, 0, 0, 255))
+        pix = doc[0].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+    finally:
+        doc.close()
+
+    img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    return ink_rect(img, zoom)
+
+
+def ink_rect(img, zoom):
+    """Box in points of the dark pixels of a greyscale image rendered at `zoom`, or None"""
+    box = img.point(lambda value: 255 if value < 128 else 0).getbbox()
+    return None if box is None else fitz.Rect(box) / zoom
+
+
+def font_ink_box(font_path, text, x, y, font_size, zoom=1):
+    """
+    Box in points the font itself gives `text` at (x, y): drawn by FreeType
+    with Pillow's basic layout, which is exact for text without conjuncts
+    """
+    font = ImageFont.truetype(font_path, font_size * zoom, layout_engine=ImageFont.Layout.BASIC)
+    width, height = fitz.paper_size("a4")
+    img = Image.new("L", (int(width * zoom), int(height * zoom)), 255)
+    ImageDraw.Draw(img).text((x * zoom, y * zoom), text, font=font, fill=0)
+    return ink_rect(img, zoom)
+
+
+def ink_width(renderer, text):
+    """Width in points of what `renderer` draws for `text`, or None"""
+    box = ink_box(renderer, text, 40, fitz.paper_size("a4")[1] / 2, PROBE_FONT_SIZE)
+    return None if box is None else box.width
+
+
+def check_shaping(renderer):
+    """Return the conjuncts of SHAPING_PROBES that `renderer` does not shape"""
+    failed = []
+    for conjunct, plain in SHAPING_PROBES:
+        conjunct_width = ink_width(renderer, conjunct)
+        plain_width = ink_width(renderer, plain)
+        if not conjunct_width or not plain_width or conjunct_width >= plain_width * CONJUNCT_WIDTH_RATIO:
+            failed.append(conjunct)
+    return failed
+
+
+def check_placement(renderer, font_path):
+    """
+    Return None when `renderer` draws PLACEMENT_PROBE where the position
+    convention of renderers.Renderer puts it (top-left corner at (x, y),
+    size in points), otherwise a description of where it went
+    """
+    x, y, font_size = PLACEMENT_POSITION
+    expected = font_ink_box(font_path, PLACEMENT_PROBE, x, y, font_size, PLACEMENT_ZOOM)
+
+    drawn = ink_box(renderer, PLACEMENT_PROBE, x, y, font_size, PLACEMENT_ZOOM)
+    if drawn is None:
+        return "sample name not drawn"
+    if max(abs(a - b) for a, b in zip(drawn, expected)) > PLACEMENT_TOLERANCE:
+        return (f"sample name drawn at ({drawn.x0:.1f}, {drawn.y0:.1f}, {drawn.x1:.1f}, {drawn.y1:.1f}), "
+                f"expected ({expected.x0:.1f}, {expected.y0:.1f}, {expected.x1:.1f}, {expected.y1:.1f})")
+    return None
+
+
+def time_engine(engine):
+    """Milliseconds per guest for rendering and serialising SAMPLE_NAMES in one batch"""
+    options = save_options(engine.compression)
+
+    def render_round(names):
+        start = time.perf_counter()
+        for doc in engine.render_documents(list(names)):
+            engine.subset_added_fonts(doc)
+            engine.compress_added_streams(doc)
+            doc.tobytes(**options)
+            doc.close()
+        return (time.perf_counter() - start) * 1000 / len(names)
+
+    render_round(SAMPLE_NAMES[:1])  # fonts, stylesheets and first-use imports
+    return min(render_round(SAMPLE_NAMES) for _ in range(CALIBRATION_ROUNDS))
+
+
+def calibrate(pdf_path, font_path, rendering="normal", overlay=None, compression="balanced",
+              template_data=None, engines=None):
+    """
+    Check and time every engine (or those named in `engines`) on this font
+    and template. Returns the calibration record; its "engine" is the
+    fastest engine that draws with the font, shapes conjuncts and places
+    names correctly, or None when no engine does.
+    """
+    if template_data is None:
+        with open(pdf_path, 'rb') as f:
+            template_data = f.read()
+
+    # Any engine would fill these in from another font
+    missing = missing_glyphs(font_path)
+
+    results = {}
+    for name in engines or RENDERERS:
+        result = results[name] = {"font_used": None, "shaping": None, "placement": None,
+                                  "ms_per_guest": None, "error": None}
+        if missing:
+            result["font_used"] = False
+            result["error"] = f"font has no glyphs for {' '.join(missing)}"
+            continue
+        try:
+            foreign = check_font_used(name, font_path, rendering)
+            result["font_used"] = not foreign
+            if foreign:
+                result["error"] = f"drawn with {', '.join(foreign)} instead of the chosen font"
+                continue
+
+            renderer = create_renderer(name, font_path, rendering, overlay)
+            failed = check_shaping(renderer)
+            result["shaping"] = not failed
+            if failed:
+                result["error"] = f"conjuncts not shaped: {', '.join(failed)}"
+                continue
+
+            misplaced = check_placement(renderer, font_path)
+            result["placement"] = misplaced is None
+            if misplaced:
+                result["error"] = misplaced
+                continue
+
+            engine = InvitationEngine(pdf_path, font_path, TIMING_POSITIONS, engine=name,
+                                      rendering=rendering, overlay=overlay,
+                                      template_data=template_data, compression=compression,
+                                      overlay_cache=False)
+            result["ms_per_guest"] = round(time_engine(engine), 3)
+        except Exception as e:
+            # Missing libraries, unsupported overlay mode, ...
+            result["error"] = f"{type(e).__name__}: {e}"
+
+    timed = [name for name, result in results.items() if result["ms_per_guest"] is not None]
+    return {
+        "version": CALIBRATION_VERSION,
+        "key": calibration_key(template_data, font_path, rendering, overlay, compression),
+        "engine": min(timed, key=lambda name: results[name]["ms_per_guest"], default=None),
+        "calibrated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "template": os.path.basename(pdf_path),
+        "font": os.path.basename(font_path),
+        "versions": {"pymupdf": fitz.VersionBind, "pillow": Image.__version__},
+        "results": results,
+    }
+
+
+def load_records(path):
+    """Calibration records of a file, keyed by calibration_key(); damaged files count as empty"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return records if isinstance(records, dict) else {}
+
+
+def save_record(path, record):
+    """Add or replace `record` in the file at `path`"""
+    records = load_records(path)
+    records[record["key"]] = record
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def choose_engine(pdf_path, font_path, rendering="normal", overlay=None, compression="balanced",
+                  template_data=None, path=None, recalibrate=False):
+    """
+    Return the calibration record for this font, template and settings:
+    the one recorded in `path` (None for default_calibration_path()) if
+    there is one, otherwise a fresh calibration, which is then recorded.
+    Raises RuntimeError when no engine draws the font's conjuncts correctly.
+    """
+    if template_data is None:
+        with open(pdf_path, 'rb') as f:
+            template_data = f.read()
+    if path is None:
+        path = default_calibration_path()
+
+    key = calibration_key(template_data, font_path, rendering, overlay, compression)
+    record = None if recalibrate else load_records(path).get(key)
+    if record is None or record.get("engine") not in RENDERERS:
+        record = calibrate(pdf_path, font_path, rendering, overlay, compression, template_data)
+        if record["engine"] is None:
+            raise RuntimeError("No engine renders this font's conjuncts correctly:\n"
+                               + describe(record))
+        try:
+            save_record(path, record)
+        except OSError:
+            pass  # read-only location: calibrate again next time
+    return record
+
+
+def describe(record):
+    """One line per engine, e.g. for printing which engine "auto" picked and why"""
+    lines = []
+    for name, result in record["results"].items():
+        if result["ms_per_guest"] is not None:
+            status = f"{result['ms_per_guest']:.1f} ms/guest"
+        else:
+            status = result["error"]
+        marker = "*" if name == record["engine"] else " "
+        lines.append(f"{marker} {name:<12}{status}")
+    return "\n".join(lines)
@@ -0,0 +1,105 @@
+"""
+Check: a batched layout pass gives the same pages as rendering each guest alone.
+
+WeasyPrint and the native engine lay out the names of many guests in one
+pass, one overlay page per guest page, and rely on every name landing on its
+own page. This renders a few guests on a 2-page card (two names on the first
+page, one on the second) both ways, as one add_text_to_documents() batch and
+one guest at a time, and compares the page count and the pixels of every
+page. Run it wherever the engine loads (WeasyPrint needs Pango) after
+changing a renderer's layout or batching.
+
+Exit status: 0 when every engine matches, 1 on a mismatch, otherwise 2 when
+an engine could not be loaded at all (so it was not checked).
+
+Usage:
+    python check_batch_layout.py font.ttf [--engines weasyprint native pillow] [--guests 6]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import fitz  # PyMuPDF
+
+from PIL import Image, ImageChops
+
+from bench_engines import build_card, make_names
+from renderers import RENDERERS, create_renderer
+
+POSITIONS = [(0, 150, 380, 28), (0, 150, 200, 18), (1, 120, 300, 24)]
+
+# Resolution the pages are compared at
+CHECK_DPI = 96
+
+
+def page_images(doc):
+    return [Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            for pix in (page.get_pixmap(dpi=CHECK_DPI) for page in doc)]
+
+
+def compare(renderer, template_path, names):
+    """Return a list of differences between batched and one-by-one rendering"""
+    batched = [fitz.open(template_path) for _ in names]
+    single = [fitz.open(template_path) for _ in names]
+    try:
+        renderer.add_text_to_documents(batched, names, POSITIONS, (0, 0, 0, 255))
+        for doc, name in zip(single, names):
+            renderer.add_text_to_documents([doc], [name], POSITIONS, (0, 0, 0, 255))
+
+        problems = []
+        for name, batch_doc, single_doc in zip(names, batched, single):
+            if len(batch_doc) != len(single_doc):
+                problems.append(f"{name}: {len(batch_doc)} pages batched, {len(single_doc)} alone")
+                continue
+            for page_num, (batch_img, single_img) in enumerate(zip(page_images(batch_doc),
+                                                                    page_images(single_doc))):
+                box = ImageChops.difference(batch_img, single_img).getbbox()
+                if box is not None:
+                    problems.append(f"{name}: page {page_num + 1} differs in {box} (pixels at {CHECK_DPI} dpi)")
+        return problems
+    finally:
+        for doc in batched + single:
+            doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check batched layout against single renders.")
+    parser.add_argument("font", help="Gujarati TrueType font (.ttf)")
+    parser.add_argument("--engines", nargs="+", default=list(RENDERERS), choices=list(RENDERERS))
+    parser.add_argument("--guests", type=int, default=6, help="guests per batch (default: 6)")
+    args = parser.parse_args()
+
+    names = make_names(args.guests)
+    mismatch = unloadable = False
+    with tempfile.TemporaryDirectory() as work_dir:
+        template_path = os.path.join(work_dir, "card.pdf")
+        build_card(template_path, 2)
+
+        for engine in args.engines:
+            for overlay in RENDERERS[engine].overlays:
+                label = f"{engine}/{overlay}"
+                try:
+                    renderer = create_renderer(engine, args.font, overlay=overlay)
+                except (ImportError, OSError) as e:
+                    print(f"{label}: could not load ({type(e).__name__}: {e})")
+                    unloadable = True
+                    continue
+
+                try:
+                    problems = compare(renderer, template_path, names)
+                except Exception as e:
+                    # e.g. WeasyPrint producing more overlay pages than requested
+                    problems = [f"{type(e).__name__}: {e}"]
+                if problems:
+                    print(f"{label}: MISMATCH")
+                    for problem in problems:
+                        print(f"  {problem}")
+                    mismatch = True
+                else:
+                    print(f"{label}: ok ({len(names)} guests, {len(POSITIONS)} positions)")
+    return 1 if mismatch else 2 if unloadable else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# test_harfbuzz.py is a diagnostic script that runs on import, not a test module
+collect_ignore = ["test_harfbuzz.py"]
@@ -0,0 +1,235 @@
+"""
+Command-line entry point for generating invitations without the GUI.
+
+Examples:
+    python invitation_cli.py generate --template card.pdf --font NotoSansGujarati-Bold.ttf \\
+        --csv guests.csv --position 1,120,340,26 --color maroon --output-dir output
+
+    python invitation_cli.py generate --template card.pdf --font NotoSansGujarati-Bold.ttf \\
+        --csv guests.csv --position 1,120,340,26 --combined all_invitations.pdf
+
+    python invitation_cli.py generate --template card.pdf --font NotoSansGujarati-Bold.ttf \\
+        --csv guests.csv --position 1,120,340,26 --output-dir output --timings --trace trace.json
+
+    python invitation_cli.py generate --template card.pdf --font NotoSansGujarati-Bold.ttf \\
+        --csv guests.csv --position 1,120,340,26 --engine auto --output-dir output
+
+    python invitation_cli.py test --template card.pdf --font NotoSansGujarati-Bold.ttf \\
+        --position 1,120,340,26 --name "શ્રી રાજેશભાઈ પટેલ" --output test_invitation.pdf
+
+Positions are PAGE,X,Y,SIZE with 1-based page numbers (as shown in the GUI)
+and PDF coordinates.
+"""
+import argparse
+import sys
+import time
+
+from invitation_engine import COMPRESSION_PROFILES, InvitationEngine, count_rows, iter_guest_names
+from overlay_cache import OverlayCache
+from renderers import AUTO, COLOR_MAP, RENDERERS, font_cache_info
+from timing import TimingReport, set_tracing
+
+
+def parse_position(value):
+    """Parse PAGE,X,Y,SIZE into the GUI's (page, x, y, font_size) tuple"""
+    try:
+        page, x, y, size = value.split(",")
+        page = int(page) - 1
+        if page < 0:
+            raise ValueError
+        return (page, float(x), float(y), int(size))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid position '{value}', expected PAGE,X,Y,SIZE (e.g. 1,120,340,26)")
+
+
+def add_common_arguments(parser):
+    parser.add_argument("--template", required=True, help="PDF invitation template")
+    parser.add_argument("--font", required=True, help="Gujarati TrueType font (.ttf)")
+    parser.add_argument("--position", dest="positions", type=parse_position,
+                        action="append", required=True,
+                        help="name position as PAGE,X,Y,SIZE (repeat for several positions)")
+    parser.add_argument("--color", default="black", choices=sorted(COLOR_MAP),
+                        help="text colour (default: black)")
+    parser.add_argument("--engine", default="native", choices=sorted(RENDERERS) + [AUTO],
+                        help="text renderer, or 'auto' for the fastest one that shapes the "
+                             "font's conjuncts on this template (default: native)")
+    parser.add_argument("--calibration", metavar="JSON",
+                        help="file recording the engine chosen by --engine auto "
+                             "(default: calibration.json in the per-user cache directory)")
+    parser.add_argument("--recalibrate", action="store_true",
+                        help="with --engine auto, calibrate again instead of using the recorded choice")
+    parser.add_argument("--rendering", default="normal", choices=("normal", "quality"),
+                        help="raster quality for the pillow engine (default: normal)")
+    parser.add_argument("--overlay", choices=("image", "vector"),
+                        help="insert the name as an image or as vector content "
+                             "(default: image for weasyprint/pillow, vector for native)")
+    parser.add_argument("--compression", default="balanced", choices=list(COMPRESSION_PROFILES),
+                        help="output compression profile (default: balanced; "
+                             "see bench_compression.py)")
+    parser.add_argument("--cache-dir",
+                        help="directory of the overlay cache shared across runs "
+                             "(default: per-user cache directory)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not read or write the overlay cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="save each invitation as the template file plus an appended "
+                             "update holding the name (faster for large templates)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Add guest names to a PDF invitation template.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="generate one invitation per guest in a CSV")
+    add_common_arguments(generate)
+    generate.add_argument("--csv", required=True, help="UTF-8 guest list with a 'name' column")
+    output = generate.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", help="directory for the generated PDFs, one per guest")
+    output.add_argument("--combined", metavar="PDF",
+                        help="write every guest's invitation into this single PDF instead")
+    generate.add_argument("--workers", type=int, default=1,
+                          help="worker processes, 0 for one per CPU core; ignored with --combined "
+                               "(default: 1)")
+    generate.add_argument("--batch-size", type=int,
+                          help="guests rendered together in one layout pass "
+                               "(default: 256 for weasyprint, 64 for native, 1 for pillow)")
+    generate.add_argument("--no-resume", dest="resume", action="store_false",
+                          help="render every guest again, even those already finished "
+                               "in the output directory")
+    generate.add_argument("--quiet", action="store_true", help="do not print per-guest progress")
+    generate.add_argument("--timings", action="store_true",
+                          help="print how long each rendering stage took")
+    generate.add_argument("--trace", metavar="JSON",
+                          help="write every stage as a Chrome trace-event file "
+                               "(open in chrome://tracing or ui.perfetto.dev)")
+
+    test = subparsers.add_parser("test", help="generate a single invitation for a sample name")
+    add_common_arguments(test)
+    test.add_argument("--name", default="શ્રી રાજેશભાઈ પટેલ", help="sample guest name")
+    test.add_argument("--output", default="test_invitation.pdf", help="output PDF path")
+
+    cache_stats = subparsers.add_parser("cache-stats",
+                                        help="show size and hit rate of the overlay cache")
+    cache_stats.add_argument("--cache-dir", help="overlay cache directory "
+                                                 "(default: per-user cache directory)")
+
+    return parser
+
+
+def create_engine(args):
+    overlay_cache = False if args.no_cache else (args.cache_dir or True)
+    if args.engine == AUTO and args.recalibrate:
+        from calibration import choose_engine
+        choose_engine(args.template, args.font, args.rendering, args.overlay, args.compression,
+                      path=args.calibration, recalibrate=True)
+
+    engine = InvitationEngine(args.template, args.font, args.positions, color=args.color,
+                              engine=args.engine, rendering=args.rendering, overlay=args.overlay,
+                              incremental=args.incremental, compression=args.compression,
+                              overlay_cache=overlay_cache, calibration=args.calibration)
+    if engine.calibration is not None:
+        from calibration import describe
+        print(f"Engine: {engine.options['engine']} (calibrated {engine.calibration['calibrated']})")
+        print(describe(engine.calibration))
+    return engine
+
+
+def run_generate(args):
+    engine = create_engine(args)
+
+    failures = []
+    skipped = []
+    reused = []
+
+    def on_malformed(line_number, message):
+        skipped.append(line_number)
+        print(f"Skipped CSV line {line_number}: {message}", file=sys.stderr)
+
+    # Stream the guest list straight into the renderer
+    guest_names = iter_guest_names(args.csv, on_malformed=on_malformed)
+    total = count_rows(args.csv)
+
+    def on_progress(completed, total, guest_name):
+        if not args.quiet:
+            print(f"[{completed}/{total}] {guest_name}")
+
+    def on_error(index, guest_name, message):
+        failures.append(guest_name)
+        print(f"Failed: {guest_name} (row {index + 1}): {message}", file=sys.stderr)
+
+    timings = TimingReport()
+    if args.trace:
+        set_tracing(True)
+
+    start = time.perf_counter()
+    if args.combined:
+        # One output file, rendered in this process
+        results = engine.generate_combined(guest_names, args.combined, progress=on_progress,
+                                           on_error=on_error, batch_size=args.batch_size,
+                                           total=total, on_stage_times=timings.add)
+        destination = args.combined
+    else:
+        results = engine.generate(guest_names, args.output_dir, progress=on_progress,
+                                  workers=args.workers or None, on_error=on_error,
+                                  batch_size=args.batch_size, total=total,
+                                  resume=args.resume,
+                                  on_reused=lambda index, guest_name: reused.append(index),
+                                  on_stage_times=timings.add)
+        destination = args.output_dir
+    elapsed = time.perf_counter() - start
+
+    # Reused guests were not rendered in this run
+    generated = len(results) - len(failures) - len(reused)
+    rate = generated / elapsed if elapsed else 0.0
+    print(f"Generated {generated} invitations in {elapsed:.1f}s "
+          f"({rate:.1f} guests/sec) -> {destination}")
+    if reused:
+        print(f"Reused {len(reused)} unchanged invitations from an earlier run")
+    if skipped:
+        print(f"Skipped {len(skipped)} malformed CSV rows", file=sys.stderr)
+    if engine.options["engine"] == "pillow" and args.workers == 1:
+        info = font_cache_info()
+        print(f"Font cache: {info.hits} hits, {info.misses} misses ({info.currsize} fonts loaded)")
+    if args.timings:
+        print(f"\nStage timings over {timings.batches} batches:")
+        print(timings.summary(guests=len(results) - len(reused)))
+    if args.trace:
+        timings.write_trace(args.trace)
+        print(f"Trace with {len(timings.events)} events written to {args.trace}")
+    return 1 if failures else 0
+
+
+def run_test(args):
+    engine = create_engine(args)
+    engine.save_invitation(args.name, args.output)
+    print(f"Test invitation saved to: {args.output}")
+
+
+def run_cache_stats(args):
+    stats = OverlayCache(args.cache_dir).stats()
+    print(f"Overlay cache: {stats['directory']}")
+    print(f"Entries:  {stats['entries']}")
+    print(f"Size:     {stats['bytes'] / 1024 ** 2:.1f} MB of {stats['max_bytes'] / 1024 ** 2:.0f} MB")
+    print(f"Hits:     {stats['hits']}")
+    print(f"Misses:   {stats['misses']}")
+    print(f"Hit rate: {stats['hit_rate']:.1%}")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == "generate":
+            return run_generate(args)
+        if args.command == "cache-stats":
+            run_cache_stats(args)
+        else:
+            run_test(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,809 @@
+"""
+Headless batch engine for personalised invitations.
+
+Takes a PDF template, a Gujarati font, the name positions, a text colour and
+a guest list, and stamps each guest's name onto a copy of the template. The
+result is returned as PDF bytes or written to disk. Nothing here imports
+tkinter, so batches run fine on machines without a display.
+"""
+import collections
+import csv
+import hashlib
+import inspect
+import itertools
+import mmap
+import multiprocessing
+import os
+import shutil
+import unicodedata
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import fitz  # PyMuPDF
+
+from journal import CompletionJournal
+from overlay_cache import OverlayCache
+from renderers import AUTO, COLOR_MAP, create_renderer
+from timing import stage, take, tracing, set_tracing
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows
+
+try:
+    import zopfli.zlib
+except ImportError:
+    zopfli = None
+
+# Keep the template's /ID instead of generating a time-based one, so that
+# repeated runs (serial or parallel) write byte-identical files.
+SAVE_OPTIONS = {"no_new_id": True}
+
+# Output compression profiles: PyMuPDF save options, the Pillow PNG encoder
+# options for overlay images, and whether to recompress the streams we add
+# with zopfli. MuPDF decodes inserted PNGs and deflates the pixels itself when
+# saving, so the PNG level only changes how much CPU the intermediate PNG
+# costs. Always deflate: PyMuPDF stores inserted overlay images as raw pixels.
+COMPRESSION_PROFILES = {
+    "fast": {
+        "save": {"deflate": True},
+        "png": {"compress_level": 1},
+        "zopfli": False,
+    },
+    "balanced": {
+        "save": {"deflate": True, "garbage": 1},
+        "png": {},
+        "zopfli": False,
+    },
+    "smallest": {
+        "save": {"deflate": True, "deflate_images": True, "deflate_fonts": True,
+                 "garbage": 3, "use_objstms": 1, "compression_effort": 100},
+        "png": {"compress_level": 1},
+        "zopfli": True,
+    },
+}
+
+# Save options an incremental update cannot use: it may only append objects
+NON_INCREMENTAL_OPTIONS = ("garbage", "use_objstms", "clean", "linear")
+
+# Batches queued per worker process; bounds memory on very large lists
+TASKS_PER_WORKER = 4
+
+# Bytes scanned at a time when counting CSV rows
+CSV_COUNT_CHUNK = 1 << 20
+
+# Linux ioctl that makes the destination share the source's data blocks
+FICLONE = 0x40049409
+
+
+def make_safe_filename(name, repl="_", maxlen=200):
+    """
+    Keep letters (all Unicode letters including Gujarati), marks and numbers.
+    Replace whitespace with `repl`, remove other forbidden filename chars.
+    Normalize to NFC so composed forms are used (better for display/shaping).
+    """
+    # Normalize to composed form (NFC)
+    name = unicodedata.normalize("NFC", name)
+
+    # Replace runs of whitespace with single repl
+    name = " ".join(name.split())  # collapse whitespace
+    name = name.replace(" ", repl)
+
+    # Remove characters that are not letters, marks, numbers, underscore or hyphen
+    safe_chars = []
+    for ch in name:
+        cat = unicodedata.category(ch)
+        # Allow Letters (L*), Marks (M*), Numbers (Nd, etc.), connector punct (Pc), dash (Pd)
+        if cat.startswith("L") or cat.startswith("M") or cat.startswith("N") or cat in ("Pc", "Pd"):
+            safe_chars.append(ch)
+        # optionally allow underscores/hyphens already present
+        elif ch == repl or ch in ("_", "-"):
+            safe_chars.append(ch)
+        # else drop it
+
+    safe = "".join(safe_chars)
+
+    # Trim length and avoid empty filename
+    if not safe:
+        safe = "name"
+    if len(safe) > maxlen:
+        safe = safe[:maxlen].rstrip(repl)
+
+    return safe
+
+
+def copy_file(src_path, dst_path):
+    """
+    Copy `src_path` to `dst_path` as a reflink where the filesystem supports
+    it (Btrfs, XFS, ...), otherwise with shutil's bulk copy.
+    """
+    if fcntl is not None:
+        try:
+            with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src_path, dst_path)
+
+
+def save_options(compression="balanced", incremental=False):
+    """
+    PyMuPDF save options for a compression profile, limited to those the
+    installed PyMuPDF supports (e.g. use_objstms and compression_effort are
+    missing from older releases).
+    """
+    if compression not in COMPRESSION_PROFILES:
+        raise ValueError(f"Unknown compression profile '{compression}' "
+                         f"(choose from: {', '.join(COMPRESSION_PROFILES)})")
+
+    options = dict(SAVE_OPTIONS, **COMPRESSION_PROFILES[compression]["save"])
+    if incremental:
+        options = {key: value for key, value in options.items() if key not in NON_INCREMENTAL_OPTIONS}
+        options.update(incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+
+    supported = inspect.signature(fitz.Document.save).parameters
+    return {key: value for key, value in options.items() if key in supported}
+
+
+def zopfli_streams(doc, first_xref=1):
+    """
+    Compress every unfiltered stream from `first_xref` on with zopfli (about
+    5% smaller than zlib, at a much higher CPU cost). Does nothing when the
+    zopfli package is not installed; the save's deflate then handles them.
+    """
+    if zopfli is None:
+        return
+    for xref in range(first_xref, doc.xref_length()):
+        if not doc.xref_is_stream(xref) or doc.xref_get_key(xref, "Filter")[0] != "null":
+            continue
+        doc.update_stream(xref, zopfli.zlib.compress(doc.xref_stream_raw(xref)), compress=False)
+        doc.xref_set_key(xref, "Filter", "/FlateDecode")
+
+
+def count_rows(csv_path):
+    """
+    Quickly count the guest rows of a CSV for progress bars: newlines are
+    counted on a memory map of the raw bytes, minus the header line. Quoted
+    names spanning lines or blank lines make this an estimate.
+    """
+    with open(csv_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            lines = sum(data[start:start + CSV_COUNT_CHUNK].count(b"\n")
+                        for start in range(0, size, CSV_COUNT_CHUNK))
+            # Last row without a trailing newline
+            if data[size - 1:size] != b"\n":
+                lines += 1
+
+    return max(lines - 1, 0)
+
+
+def iter_guest_names(csv_path, on_malformed=None):
+    """
+    Yield the 'name' column of a UTF-8 guest CSV one row at a time, so very
+    large lists never sit in memory. Rows without a usable name (missing
+    field, blank name, invalid UTF-8, unparsable CSV) are skipped and
+    reported as `on_malformed(line_number, message)`. A file without a
+    header or without a 'name' column raises ValueError.
+    """
+    # utf-8-sig: Excel puts a byte order mark in front of the header
+    with open(csv_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+        reader = csv.reader(f)
+        try:
+            header = next(reader)
+        except StopIteration:
+            raise ValueError("CSV file is empty!")
+
+        # Check for 'name' column
+        if 'name' not in header:
+            raise ValueError("CSV must have a 'name' column!")
+        name_column = header.index('name')
+
+        def report(message):
+            if on_malformed:
+                on_malformed(reader.line_num, message)
+
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                report(f"unreadable row: {e}")
+                continue
+
+            if not row:
+                continue  # blank line
+            if len(row) <= name_column:
+                report(f"no value in the 'name' column (found {len(row)} fields)")
+            elif not row[name_column].strip():
+                report("empty name")
+            elif "\ufffd" in row[name_column]:
+                report("name is not valid UTF-8")
+            else:
+                yield row[name_column]
+
+
+class InvitationEngine:
+    """
+    Stamp guest names onto a PDF template without any GUI.
+
+    `positions` is a list of (page, x, y, font_size) tuples with 0-based page
+    numbers, exactly as collected by the GUI. `color` is a name from
+    COLOR_MAP or an RGB(A) tuple. `engine` selects the renderer
+    ("weasyprint", "pillow", "native" or any other registered engine),
+    `rendering` its quality ("normal" or "quality") and `overlay` how the
+    name is placed on the page ("image" or "vector"; None picks the engine's
+    default). engine="auto" uses the fastest engine that shapes this font's
+    conjuncts, as calibrated by calibration.choose_engine() and recorded in
+    the `calibration` file (None for the per-user default); the record is
+    kept as `self.calibration`.
+
+    The template file is read once; every guest's copy is opened from those
+    bytes in memory. `template_data` passes in bytes that are already loaded.
+    With `incremental` each saved invitation is instead a copy of the
+    template file plus an appended incremental update holding the overlay,
+    so saving costs depend on the overlay rather than the template size.
+    `compression` names one of COMPRESSION_PROFILES. Rendered overlays are
+    kept in an on-disk OverlayCache shared across runs: `overlay_cache` is
+    True for the default per-user directory, a directory path, or False to
+    render everything from scratch. `name_separator` stands in for the
+    spaces of a guest's name in its output file name.
+    """
+
+    def __init__(self, pdf_path, font_path, positions, color="black",
+                 engine="native", rendering="normal", overlay=None, template_data=None,
+                 incremental=False, compression="balanced", overlay_cache=True, calibration=None,
+                 name_separator="_"):
+        if not positions:
+            raise ValueError("At least one name position is required")
+
+        self.pdf_path = pdf_path
+        if template_data is None:
+            with open(pdf_path, 'rb') as f:
+                template_data = f.read()
+        self.template_data = template_data
+        self.incremental = incremental
+        self.compression = compression
+        self.save_options = save_options(compression, incremental)
+        # Objects from this number on were added by us (zopfli only touches those)
+        template = self.open_template()
+        self.template_xref_length = template.xref_length()
+        template.close()
+        self.font_path = font_path
+        self.positions = list(positions)
+        self.name_separator = name_separator
+        if isinstance(color, str):
+            if color not in COLOR_MAP:
+                raise ValueError(f"Unknown colour '{color}' (choose from: {', '.join(COLOR_MAP)})")
+            self.text_color = COLOR_MAP[color]
+        else:
+            self.text_color = tuple(color)
+        self.calibration = None
+        if engine == AUTO:
+            # Imported here: the calibration builds engines of its own
+            from calibration import choose_engine
+            self.calibration = choose_engine(pdf_path, font_path, rendering, overlay, compression,
+                                             template_data, calibration)
+            engine = self.calibration["engine"]
+        self.overlay_cache = None
+        if overlay_cache:
+            self.overlay_cache = OverlayCache(None if overlay_cache is True else overlay_cache)
+        self.renderer = create_renderer(engine, font_path, rendering, overlay,
+                                        COMPRESSION_PROFILES[compression]["png"], self.overlay_cache)
+
+        # Constructor arguments, used to build one engine per worker process.
+        # Forked workers inherit the template bytes copy-on-write instead of
+        # reading the file again. "engine" is the calibrated choice for "auto",
+        # so workers and the journal use that engine.
+        self.options = {
+            "pdf_path": pdf_path,
+            "template_data": template_data,
+            "font_path": font_path,
+            "positions": self.positions,
+            "color": self.text_color,
+            "engine": engine,
+            "rendering": rendering,
+            "overlay": overlay,
+            "incremental": incremental,
+            "compression": compression,
+            "overlay_cache": overlay_cache,
+        }
+        self._fingerprint = None
+
+    def open_template(self):
+        """Open a fresh copy of the template from the in-memory bytes"""
+        return fitz.open("pdf", self.template_data)
+
+    def open_output(self, output_path):
+        """Open the document a guest's invitation is built in before saving it to `output_path`"""
+        if not self.incremental:
+            return self.open_template()
+        # An incremental save appends to the file the document was opened from
+        copy_file(self.pdf_path, output_path)
+        return fitz.open(output_path)
+
+    def compress_added_streams(self, doc, first_xref=None):
+        """Apply the profile's zopfli pass to the streams added since the template"""
+        if COMPRESSION_PROFILES[self.compression]["zopfli"]:
+            with stage("zopfli"):
+                zopfli_streams(doc, self.template_xref_length if first_xref is None else first_xref)
+
+    def subset_added_fonts(self, doc):
+        """
+        Cut fonts the renderer embedded whole (native text) down to the glyphs
+        used. Older PyMuPDF releases need fontTools for this; without it the
+        full font is kept.
+        """
+        if not self.renderer.subset_fonts:
+            return
+        with stage("subset_fonts"):
+            try:
+                doc.subset_fonts()
+            except ImportError:
+                pass
+
+    def save_document(self, doc, output_path):
+        self.subset_added_fonts(doc)
+        self.compress_added_streams(doc)
+        with stage("pdf_save"):
+            doc.save(output_path, **self.save_options)
+
+    def render_document(self, guest_name):
+        """Return an open fitz document with the name added at every position"""
+        doc = self.open_template()
+        try:
+            self.renderer.add_text_to_document(doc, guest_name, self.positions, self.text_color)
+        except Exception:
+            doc.close()
+            raise
+        return doc
+
+    def render_bytes(self, guest_name):
+        """Return the personalised invitation as PDF bytes"""
+        doc = self.render_document(guest_name)
+        try:
+            self.subset_added_fonts(doc)
+            self.compress_added_streams(doc)
+            return doc.tobytes(**save_options(self.compression))
+        finally:
+            doc.close()
+
+    def save_invitation(self, guest_name, output_path):
+        """Write the personalised invitation to `output_path`"""
+        self.save_invitations([guest_name], [output_path])
+        self.flush_cache_stats()
+
+    def take_cache_stats(self):
+        """Overlay cache (hits, misses, bytes added) of this process since the last call"""
+        if self.overlay_cache is None:
+            return (0, 0, 0)
+        return self.overlay_cache.take_stats()
+
+    def count_cache_stats(self, stage_times):
+        """Count a batch's overlay cache lookups (see _save_batch) towards the next flush"""
+        if self.overlay_cache is not None:
+            self.overlay_cache.add_stats(*stage_times.get("overlay_cache", (0, 0, 0)))
+
+    def flush_cache_stats(self):
+        """Write the overlay cache lookups counted so far to its stats log, once per run"""
+        if self.overlay_cache is not None:
+            self.overlay_cache.flush_stats()
+
+    def render_documents(self, guest_names):
+        """Like render_document for many guests, letting the renderer batch its work"""
+        docs = [self.open_template() for _ in guest_names]
+        try:
+            self.renderer.add_text_to_documents(docs, guest_names, self.positions, self.text_color)
+        except Exception:
+            for doc in docs:
+                doc.close()
+            raise
+        return docs
+
+    def save_invitations(self, guest_names, output_paths):
+        """Write several invitations, rendered together in one batch"""
+        docs = []
+        try:
+            with stage("open"):
+                for output_path in output_paths:
+                    docs.append(self.open_output(output_path))
+            with stage("render"):
+                self.renderer.add_text_to_documents(docs, guest_names, self.positions, self.text_color)
+            with stage("save"):
+                for doc, output_path in zip(docs, output_paths):
+                    self.save_document(doc, output_path)
+        except Exception:
+            for doc in docs:
+                doc.close()
+            if self.incremental:
+                # Do not leave bare template copies behind
+                for output_path in output_paths[:len(docs)]:
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+            raise
+
+        for doc in docs:
+            doc.close()
+
+    def generate_combined(self, guest_names, output_path, progress=None, on_error=None,
+                          batch_size=None, total=None, on_stage_times=None):
+        """
+        Write every guest's invitation into the single PDF `output_path`.
+
+        Each template page is stored once as a form XObject that every guest
+        page shows, with that guest's name overlay on top, so the file grows
+        with the number of names rather than with copies of the template.
+        Template links, annotations and form fields are not carried over.
+        Rendering happens in this process. `guest_names`, `progress`, `total`,
+        `on_error` and `on_stage_times` behave as in generate(). Returns each guest's first
+        (0-based) page number in the combined file, or None for guests that
+        failed.
+        """
+        if total is None and hasattr(guest_names, "__len__"):
+            total = len(guest_names)
+        if batch_size is None:
+            batch_size = self.renderer.batch_size
+        batches = make_batches(((index, guest_name, None)
+                                for index, guest_name in enumerate(guest_names)), batch_size)
+
+        first_pages = []
+        take()  # only time this run's stages
+        template = self.open_template()
+        combined = fitz.open()
+        try:
+            for batch in batches:
+                with stage("render"):
+                    added = self._add_combined_batch(combined, template, batch)
+                if on_stage_times:
+                    on_stage_times(take())
+                for index, guest_name, first_page, error in added:
+                    if error is not None:
+                        if on_error is None:
+                            raise RuntimeError(
+                                f"Failed to generate invitation for '{guest_name}': {error}")
+                        on_error(index, guest_name, error)
+                    first_pages.append(first_page)
+                    if progress:
+                        progress(len(first_pages), total, guest_name)
+
+            # Every object of the combined file is new. Garbage collection
+            # (at least level 1) drops objects left behind by a failed guest.
+            with stage("save"):
+                self.subset_added_fonts(combined)
+                self.compress_added_streams(combined, first_xref=1)
+                options = save_options(self.compression)
+                options["garbage"] = max(options.get("garbage", 0), 1)
+                with stage("pdf_save"):
+                    combined.save(output_path, **options)
+            if on_stage_times:
+                on_stage_times(take())
+        finally:
+            combined.close()
+            template.close()
+            self.flush_cache_stats()
+
+        return first_pages
+
+    def _add_combined_batch(self, combined, template, batch):
+        """
+        Append a batch of guests to `combined`, returning
+        [(index, guest_name, first page or None, error), ...]
+        """
+        start = len(combined)
+        views = [append_template(combined, template) for _ in batch]
+        try:
+            self.renderer.add_text_to_documents(views, [guest_name for _, guest_name, _ in batch],
+                                                self.positions, self.text_color)
+        except Exception as e:
+            combined.delete_pages(start, len(combined) - 1)
+            if len(batch) == 1:
+                index, guest_name, _ = batch[0]
+                return [(index, guest_name, None, f"{type(e).__name__}: {e}")]
+
+            # Redo the batch one guest at a time so the failure is pinned on the right guest
+            results = []
+            for task in batch:
+                results.extend(self._add_combined_batch(combined, template, [task]))
+            return results
+        return [(index, guest_name, view.first_page, None)
+                for (index, guest_name, _), view in zip(batch, views)]
+
+    def job_fingerprint(self):
+        """
+        Hash of everything besides the guest name that shapes an invitation:
+        template and font contents, positions, colour, engine and output options
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256(self.template_data)
+            with open(self.font_path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+            settings = {key: value for key, value in self.options.items()
+                        if key not in ("pdf_path", "font_path", "template_data", "overlay_cache")}
+            digest.update(repr(sorted(settings.items())).encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def guest_key(self, guest_name):
+        """Content hash identifying one guest's invitation, used by the completion journal"""
+        return hashlib.sha256(f"{self.job_fingerprint()}\n{guest_name}".encode("utf-8")).hexdigest()
+
+    def output_path_for(self, output_dir, guest_name, taken=None):
+        """
+        File name used for a guest inside `output_dir`. `taken` collects the
+        file names handed out so far in a run: a guest whose file name would
+        clash with one of them (a duplicate name, or one differing only in
+        characters a file name cannot hold or in case) gets a numbered
+        suffix such as "_2" instead.
+        """
+        stem = f"invitation_{make_safe_filename(guest_name, repl=self.name_separator)}"
+        file_name = f"{stem}.pdf"
+        if taken is not None:
+            number = 1
+            # Case-insensitive file systems (Windows, macOS) clash on case too
+            while file_name.casefold() in taken:
+                number += 1
+                file_name = f"{stem}_{number}.pdf"
+            taken.add(file_name.casefold())
+        return os.path.join(output_dir, file_name)
+
+    def generate(self, guest_names, output_dir, progress=None, workers=1, on_error=None,
+                 batch_size=None, total=None, resume=True, on_reused=None,
+                 on_stage_times=None, cancel=None, background=False):
+        """
+        Write one invitation per guest into `output_dir`.
+
+        `workers` > 1 spreads the guests across that many processes (None
+        uses every core); the files are identical to a serial run. Guests
+        are rendered in batches of `batch_size` (None uses the renderer's
+        preferred size, e.g. 256 names per WeasyPrint layout pass); each
+        batch goes to a single worker.
+        `guest_names` may be any iterable, such as iter_guest_names()
+        streaming a large CSV; it is consumed one batch at a time.
+        Guests whose file names would clash get numbered file names (see
+        output_path_for), in CSV order, so reruns pick the same ones.
+        `progress(completed, total, guest_name)` is called after each guest
+        is written; `total` defaults to len(guest_names) when that is known
+        and None otherwise. If `on_error(index, guest_name, message)` is
+        given, a failing guest is reported there and the batch carries on;
+        otherwise the first failure is raised. Returns the written file paths
+        in guest order (None for guests that failed).
+
+        Finished guests are recorded in a journal inside `output_dir`. With
+        `resume`, guests whose file from an earlier run is still there and
+        was made from the same name, template, font and settings are not
+        rendered again; they are reported to `on_reused(index, guest_name)`
+        and count towards `progress` like the others.
+
+        `on_stage_times(times)` receives timing.take() of each finished
+        batch, with the seconds spent per stage ("open", "render", "save"
+        and the stages nested in them), e.g. for TimingReport.add; while
+        timing.tracing() is on, worker processes trace too. Setting the
+        `cancel` event (e.g. a threading.Event) stops handing out batches:
+        batches not yet started are dropped, those being rendered finish
+        and are reported and journalled like the others, so the next run
+        picks up from there; keep `batch_size` small to cancel promptly.
+        With `background` the rendering happens in worker processes even
+        for a single worker, leaving the calling process free, e.g. for a
+        GUI that runs generate() on a thread.
+        """
+        if total is None and hasattr(guest_names, "__len__"):
+            total = len(guest_names)
+        os.makedirs(output_dir, exist_ok=True)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if batch_size is None:
+            batch_size = self.renderer.batch_size
+
+        journal = CompletionJournal(output_dir)
+        keys = {}  # index -> journal key, for guests being rendered
+        reused = collections.deque()
+        # Every guest gets a file of its own, so no two workers write the same path
+        taken = set()
+
+        def tasks_to_render():
+            for index, guest_name in enumerate(guest_names):
+                output_path = self.output_path_for(output_dir, guest_name, taken)
+                key = self.guest_key(guest_name)
+                if resume and journal.is_done(output_path, key):
+                    reused.append((index, guest_name, output_path))
+                    continue
+                keys[index] = key
+                yield index, guest_name, output_path
+
+        batches = make_batches(tasks_to_render(), batch_size)
+
+        # Never start more processes than there are batches
+        first_batches = list(itertools.islice(batches, workers))
+        workers = min(workers, len(first_batches))
+        batches = itertools.chain(first_batches, batches)
+
+        if workers > 1 or (background and first_batches):
+            rendered = self._generate_parallel(batches, workers, on_stage_times,
+                                               spawn=background, cancel=cancel)
+        else:
+            rendered = self._generate_serial(batches, on_stage_times, cancel)
+
+        def results():
+            # Reused guests are found while the renderer pulls the next batch
+            for result in itertools.chain(rendered, [None]):
+                while reused:
+                    yield reused.popleft(), None, True
+                if result is not None:
+                    yield result + (False,)
+
+        output_paths = []
+        completed = 0
+        try:
+            for (index, guest_name, output_path), error, was_reused in results():
+                key = None if was_reused else keys.pop(index)
+                if was_reused:
+                    if on_reused:
+                        on_reused(index, guest_name)
+                elif error is not None:
+                    if on_error is None:
+                        raise RuntimeError(
+                            f"Failed to generate invitation for '{guest_name}': {error}")
+                    on_error(index, guest_name, error)
+                    output_path = None
+                else:
+                    journal.record(output_path, key, guest_name)
+
+                # Parallel batches may finish out of order
+                if index >= len(output_paths):
+                    output_paths.extend([None] * (index + 1 - len(output_paths)))
+                output_paths[index] = output_path
+
+                completed += 1
+                if progress:
+                    progress(completed, total, guest_name)
+        finally:
+            # Stops the renderer, dropping batches that have not started
+            rendered.close()
+            journal.close()
+            self.flush_cache_stats()
+
+        return output_paths
+
+    def _generate_serial(self, batches, on_stage_times=None, cancel=None):
+        """Yield (task, error) for each guest, rendering in this process until `cancel` is set"""
+        # Stages timed before this run (e.g. test renders) are not part of it
+        take()
+        for batch in batches:
+            if cancel is not None and cancel.is_set():
+                return
+            results, stage_times = _save_batch(self, batch)
+            self.count_cache_stats(stage_times)
+            if on_stage_times:
+                on_stage_times(stage_times)
+            for task, (_, error) in zip(batch, results):
+                yield task, error
+
+    def _generate_parallel(self, batches, workers, on_stage_times=None, spawn=False, cancel=None):
+        """
+        Yield (task, error) for each guest as the worker processes finish
+        them. `spawn` starts fresh interpreters instead of forking, for
+        callers with threads or a GUI toolkit loaded. Once `cancel` is set,
+        queued batches are dropped and only those already running finish.
+        """
+        max_pending = workers * TASKS_PER_WORKER
+        context = multiprocessing.get_context("spawn") if spawn else None
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.options, tracing()), mp_context=context) as executor:
+            # Future -> the batch it renders
+            pending = {}
+            try:
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        # Running batches cannot be stopped; their files still get journalled
+                        for future in [future for future in pending if future.cancel()]:
+                            del pending[future]
+                    else:
+                        # Keep a bounded number of batches queued
+                        for batch in batches:
+                            pending[executor.submit(_render_in_worker, batch)] = batch
+                            if len(pending) >= max_pending:
+                                break
+
+                    if not pending:
+                        break
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in sorted(done, key=lambda f: pending[f][0][0]):
+                        batch = pending.pop(future)
+                        results, stage_times = future.result()
+                        self.count_cache_stats(stage_times)
+                        if on_stage_times:
+                            on_stage_times(stage_times)
+                        for task, (_, error) in zip(batch, results):
+                            yield task, error
+            finally:
+                # Stopped early (error or caller gave up): drop queued batches
+                for future in pending:
+                    future.cancel()
+
+
+class GuestPages:
+    """One guest's copy of the template pages inside a combined document"""
+
+    def __init__(self, doc, first_page):
+        self.doc = doc
+        self.first_page = first_page
+
+    def __getitem__(self, page_num):
+        return self.doc[self.first_page + page_num]
+
+
+def append_template(combined, template):
+    """Append one copy of the template's pages to `combined` and return a view on them"""
+    first_page = len(combined)
+    for template_page in template:
+        page = combined.new_page(width=template_page.rect.width,
+                                 height=template_page.rect.height)
+        # PyMuPDF reuses the form XObject each time the same template page is shown
+        page.show_pdf_page(page.rect, template, template_page.number)
+    return GuestPages(combined, first_page)
+
+
+def make_batches(tasks, batch_size):
+    """Lazily group (index, guest_name, output_path) tasks into lists of up to `batch_size`"""
+    tasks = iter(tasks)
+    batch_size = max(1, batch_size)
+    while True:
+        batch = list(itertools.islice(tasks, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# Engine owned by each worker process, built once by _init_worker
+_worker_engine = None
+
+
+def _init_worker(options, trace=False):
+    """Pool initializer: load the font, template settings and renderer once per process"""
+    global _worker_engine
+    set_tracing(trace)
+    _worker_engine = InvitationEngine(**options)
+
+
+def _render_in_worker(batch):
+    return _save_batch(_worker_engine, batch)
+
+
+def _save_batch(engine, batch):
+    """
+    Render and write a batch of guests, returning
+    ([(index, error message or None), ...], stage times), where the stage
+    times from timing.take() also carry the batch's overlay cache
+    (hits, misses, bytes added) for the parent process to record
+    """
+    if len(batch) == 1:
+        results = [_save_guest(engine, *batch[0])]
+    else:
+        try:
+            engine.save_invitations([guest_name for _, guest_name, _ in batch],
+                                    [output_path for _, _, output_path in batch])
+            results = [(index, None) for index, _, _ in batch]
+        except Exception:
+            # Redo the batch one guest at a time so the failure is pinned on the right guest
+            results = [_save_guest(engine, *task) for task in batch]
+    stage_times = take()
+    stage_times["overlay_cache"] = engine.take_cache_stats()
+    return results, stage_times
+
+
+def _save_guest(engine, index, guest_name, output_path):
+    """Render and write one guest, returning (index, error message or None)"""
+    try:
+        engine.save_invitations([guest_name], [output_path])
+    except Exception as e:
+        return index, f"{type(e).__name__}: {e}"
+    return index, None
@@ -0,0 +1,85 @@
+"""
+Completion journal for resumable batches.
+
+Each output directory gets a small append-only JSON-lines file that records
+every invitation written there, together with a content hash of everything
+that went into it (guest name, template, font, positions, colour, engine and
+output options). A rerun skips guests whose file is still on disk with a
+matching hash, so a crashed or cancelled batch resumes where it stopped and
+a run after a small CSV edit only renders the changed names.
+"""
+import json
+import os
+
+JOURNAL_NAME = ".invitations_journal.jsonl"
+
+# Bump when a code change alters the rendered output, to invalidate old journals
+JOURNAL_VERSION = 4
+
+
+class CompletionJournal:
+    """Finished invitations of one output directory, keyed by file name"""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, JOURNAL_NAME)
+        self.entries = {}
+        self._file = None
+        self.load()
+
+    def load(self):
+        """Read the journal; later lines win and damaged lines are ignored"""
+        if not os.path.exists(self.path):
+            return
+
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                    if entry["version"] == JOURNAL_VERSION:
+                        self.entries[entry["file"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    continue  # e.g. a line cut short by a crash
+
+        # Drop superseded and stale lines so reruns do not grow the file forever
+        if lines > len(self.entries):
+            self.compact()
+
+    def compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def is_done(self, output_path, key):
+        """True if `output_path` was written for `key` and is still intact on disk"""
+        entry = self.entries.get(os.path.basename(output_path))
+        if entry is None or entry["key"] != key:
+            return False
+        try:
+            return os.path.getsize(output_path) == entry["size"]
+        except OSError:
+            return False
+
+    def record(self, output_path, key, guest_name):
+        """Append a finished invitation; flushed at once so a crash loses at most one line"""
+        entry = {
+            "version": JOURNAL_VERSION,
+            "file": os.path.basename(output_path),
+            "name": guest_name,
+            "key": key,
+            "size": os.path.getsize(output_path),
+        }
+        self.entries[entry["file"]] = entry
+
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,264 @@
+"""
+Persistent on-disk cache of rendered name overlays.
+
+The same families are invited to the wedding, the reception and the mehndi,
+so the same names get shaped and rasterised run after run. Overlays are
+stored under a hash of everything that affects their pixels (font file
+contents, text, sizes, colour, engine, scale), so later runs and test prints
+reuse them. The cache is bounded in size and evicts least recently used
+entries, using file modification times as the access clock. Several worker
+processes may share one cache directory.
+
+The bytes in use are kept as a running total in the stats log next to the
+hit and miss counts, so a process does not have to scan the whole directory
+before its first write. Every eviction and `cache-stats` scans anyway and
+sets the total right again.
+"""
+import hashlib
+import os
+import struct
+
+# Bump when a code change alters the rendered overlays
+CACHE_VERSION = 3
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# After an eviction the cache is this fraction of its budget
+EVICT_TO = 0.9
+
+# Header of each image in an entry: its rect relative to the placement
+# offset and the length of the PNG bytes that follow
+HEADER = struct.Struct("<4dI")
+
+STATS_NAME = "stats.log"
+
+# The stats log is folded into a single line once it has this many lines
+STATS_FOLD_LINES = 64
+
+
+def default_cache_dir():
+    """Per-user cache directory (INVITATION_CACHE_DIR overrides it)"""
+    if os.environ.get("INVITATION_CACHE_DIR"):
+        return os.environ["INVITATION_CACHE_DIR"]
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "pdfnameadder", "overlays")
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """Cache key for the given overlay description"""
+    return hashlib.sha256(repr((CACHE_VERSION,) + parts).encode("utf-8")).hexdigest()
+
+
+class OverlayCache:
+    """
+    Size-bounded directory of overlays. Each entry holds the overlay's
+    images, each as its rect (relative to the placement offset) followed by
+    the PNG bytes.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Bytes this process added to (or removed from) the cache since the last flush
+        self.added = 0
+        # Bytes on disk; read from the stats log on the first write
+        self._size = None
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".ovl")
+
+    def get(self, key):
+        """Return [(rect tuple, png_bytes), ...] for `key`, or None"""
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        images = []
+        position = 0
+        while position + HEADER.size <= len(data):
+            *rect, length = HEADER.unpack_from(data, position)
+            position += HEADER.size + length
+            images.append((tuple(rect), data[position - length:position]))
+        if not images or position != len(data):
+            self.misses += 1  # e.g. an entry cut short
+            return None
+        self.hits += 1
+        return images
+
+    def put(self, key, images):
+        """Store an overlay's [(rect, png_bytes), ...]; a failing write only costs the cache entry"""
+        path = self.entry_path(key)
+        data = b"".join(HEADER.pack(*rect, len(png_bytes)) + png_bytes
+                        for rect, png_bytes in images)
+        if self._size is None:
+            self._size = self.recorded_size()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Other processes only ever see complete entries
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        self._size += len(data)
+        self.added += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def recorded_size(self):
+        """Bytes in use as of the stats log, scanning only a cache that has no total yet"""
+        size = self.read_stats()[2]
+        if size is None:
+            size = sum(entry_size for _, entry_size, _ in self.scan())
+        return size
+
+    def scan(self):
+        """Yield (path, size, mtime) for every entry"""
+        try:
+            subdirs = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for subdir in subdirs:
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.endswith(".ovl"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue  # evicted by another process meanwhile
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Delete least recently used entries until the cache is under budget"""
+        entries = sorted(self.scan(), key=lambda entry: entry[2])
+        size = sum(entry_size for _, entry_size, _ in entries)
+        target = self.max_bytes * EVICT_TO
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+        # Correct the running total by whatever it had drifted
+        self.added += size - self._size
+        self._size = size
+
+    def take_stats(self):
+        """Return this process's (hits, misses, bytes added) since the last call and start afresh"""
+        counts = (self.hits, self.misses, self.added)
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        return counts
+
+    def add_stats(self, hits, misses, added=0):
+        """Count lookups and writes made elsewhere, e.g. by worker processes, towards the next flush"""
+        self.hits += hits
+        self.misses += misses
+        self.added += added
+
+    def read_stats(self):
+        """
+        Lifetime (hits, misses, bytes in use, lines) of the shared stats log;
+        bytes in use is None when the log does not record them yet
+        """
+        hits = misses = lines = 0
+        size = None
+        try:
+            with open(os.path.join(self.directory, STATS_NAME), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        line_hits, line_misses, *line_bytes = map(int, line.split())
+                    except ValueError:
+                        continue
+                    hits += line_hits
+                    misses += line_misses
+                    if line_bytes:
+                        size = (size or 0) + line_bytes[0]
+                    lines += 1
+        except OSError:
+            pass
+        return hits, misses, size, lines
+
+    def fold_stats(self, hits, misses, size):
+        """Replace the stats log with a single line of totals"""
+        path = os.path.join(self.directory, STATS_NAME)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f"{hits} {misses} {max(0, size)}\n")
+        os.replace(tmp_path, path)
+
+    def flush_stats(self):
+        """
+        Add the pending hit/miss counts and bytes added to the shared stats
+        log, as one line. Callers flush once per run; the log is folded back
+        into one line when it gets long. A run appending while another folds
+        may lose its line, which only makes the hit rate and the running
+        total slightly less exact until the next eviction.
+        """
+        if not (self.hits or self.misses or self.added):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            hits, misses, size, lines = self.read_stats()
+            if size is None:
+                # First total for this cache: count what is on disk, this run's writes included
+                self.fold_stats(hits + self.hits, misses + self.misses,
+                                sum(entry_size for _, entry_size, _ in self.scan()))
+            elif lines + 1 >= STATS_FOLD_LINES:
+                self.fold_stats(hits + self.hits, misses + self.misses, size + self.added)
+            else:
+                with open(os.path.join(self.directory, STATS_NAME), 'a', encoding='utf-8') as f:
+                    f.write(f"{self.hits} {self.misses} {self.added}\n")
+        except OSError:
+            return
+        self.take_stats()
+
+    def stats(self):
+        """Entries, bytes used and lifetime hits/misses of the cache directory"""
+        entries = 0
+        used = 0
+        for _, size, _ in self.scan():
+            entries += 1
+            used += size
+
+        hits, misses, size, lines = self.read_stats()
+        if lines > 1 or size != used:
+            try:
+                self.fold_stats(hits, misses, used)
+            except OSError:
+                pass
+
+        lookups = hits + misses
+        return {
+            "directory": self.directory,
+            "entries": entries,
+            "bytes": used,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
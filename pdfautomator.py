@@ -1,27 +1,35 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk, ImageDraw, ImageFont
-import fitz  # PyMuPDF
 import csv
-import os
+import threading
+import tkinter as tk
 from pathlib import Path
-import io
-from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
+from tkinter import ttk, filedialog, messagebox
+
+# PyMuPDF, Pillow and the text engine are imported on first use, or in the
+# background once the window is up, so the window appears straight away
+from preview import ZOOM_DEBOUNCE_MS, PagePreview
+
+# Text renderer picked at start: "auto" calibrates the registered engines on
+# the chosen font and template and keeps the fastest that shapes conjuncts
+ENGINE = "auto"
+
+# Choices of the Engine box; listed here so the window opens without
+# importing the renderers (see renderers.RENDERERS)
+ENGINES = ("auto", "native", "pillow", "weasyprint")
+
+# Start loading the heavy modules this long after the window appears
+WARM_UP_DELAY_MS = 200
+
+# How often the Tk thread checks whether the engine is ready
+ENGINE_POLL_MS = 100
+
 
-from weasyprint import HTML
-from PyPDF2 import PdfReader, PdfWriter
-from io import BytesIO
-# Try to import arabic_reshaper and bidi for proper text shaping
-try:
-    from PIL import ImageFont
-    import PIL.features
-    # Check if Pillow has harfbuzz support
-    HAS_HARFBUZZ = PIL.features.check_feature('raqm')
-except:
-    HAS_HARFBUZZ = False
+def check_text_shaping():
+    """Whether Pillow has Harfbuzz/Raqm support for complex scripts"""
+    try:
+        import PIL.features
+        return PIL.features.check_feature('raqm')
+    except:
+        return False
 
 class InvitationNameAdder:
     def __init__(self, root):
@@ -37,16 +45,33 @@ class InvitationNameAdder:
         self.csv_path = None
         self.font_path = None
         self.font_size = 20
+        self.text_shaping_available = None  # checked while warming up
+        
+        self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(WARM_UP_DELAY_MS, self.start_warm_up)
+    
+    def on_close(self):
+        """Stop the preview's render process along with the window"""
+        self.preview.close()
+        self.root.destroy()
+    
+    def start_warm_up(self):
+        """Load PyMuPDF, Pillow and the text engine in the background"""
+        threading.Thread(target=self.warm_up, args=(self.engine_var.get(),), daemon=True).start()
+    
+    def warm_up(self, engine):
+        # Runs on a background thread: imports only, no Tk calls
+        import invitation_engine, progress_dialog
+        from renderers import warm_up
+        warm_up(engine)
         
         # Check text shaping support
-        if HAS_HARFBUZZ:
-            self.text_shaping_available = True
+        self.text_shaping_available = check_text_shaping()
+        if self.text_shaping_available:
             print("✓ Advanced text shaping available (Harfbuzz/Raqm)")
         else:
-            self.text_shaping_available = False
             print("⚠ Basic text rendering (conjuncts may not work perfectly)")
-        
-        self.setup_ui()
     
     def setup_ui(self):
         # Main container
@@ -139,14 +164,27 @@ class InvitationNameAdder:
         ttk.Spinbox(font_frame, from_=8, to=120, textvariable=self.size_var, 
                    width=22).pack(fill='x', pady=2)
         
-        # Text rendering options
-        ttk.Label(font_frame, text="Rendering:").pack(anchor=tk.W, pady=(5,0))
+        # Text engine; "auto" picks one by calibration and shows it once chosen
+        ttk.Label(font_frame, text="Engine:").pack(anchor=tk.W, pady=(5,0))
+        self.engine_var = tk.StringVar(value=ENGINE)
+        ttk.Combobox(font_frame, textvariable=self.engine_var, values=ENGINES,
+                     state="readonly", width=20).pack(fill='x', pady=2)
+        self.engine_label = ttk.Label(font_frame, text="In use: not chosen yet", foreground="gray")
+        self.engine_label.pack(anchor=tk.W)
+        
+        # Raster quality of the pillow engine's name images
+        ttk.Label(font_frame, text="Rendering (pillow engine):").pack(anchor=tk.W, pady=(5,0))
         self.rendering_var = tk.StringVar(value="normal")
         ttk.Radiobutton(font_frame, text="Normal", variable=self.rendering_var, 
                        value="normal").pack(anchor=tk.W)
         ttk.Radiobutton(font_frame, text="Better Quality (Slower)", variable=self.rendering_var, 
                        value="quality").pack(anchor=tk.W)
         
+        # Off unless asked for: the overlay cache keeps files in the user's cache folder
+        self.cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(font_frame, text="Reuse names from earlier runs (disk cache)",
+                        variable=self.cache_var).pack(anchor=tk.W, pady=(5,0))
+        
         # Color settings
         ttk.Label(font_frame, text="Text Color:").pack(anchor=tk.W, pady=(5,0))
         color_frame = ttk.Frame(font_frame)
@@ -247,8 +285,9 @@ class InvitationNameAdder:
         h_scrollbar = ttk.Scrollbar(canvas_frame, orient="horizontal", command=self.canvas.xview)
         h_scrollbar.grid(row=1, column=0, sticky=(tk.E, tk.W))
         
-        self.canvas.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
         self.canvas.bind('<Button-1>', self.on_canvas_click)
+        self.preview = PagePreview(self.canvas)
+        self.preview.follow_view(h_scrollbar, v_scrollbar)
         
         # Zoom controls
         zoom_frame = ttk.Frame(display_frame)
@@ -267,9 +306,13 @@ class InvitationNameAdder:
         
         if path:
             try:
+                from PIL import ImageFont
+                from renderers import clear_font_cache
+                
                 # Test if font can be loaded
                 test_font = ImageFont.truetype(path, 20)
                 self.font_path = path
+                clear_font_cache()
                 self.font_label.config(
                     text=f"✓ Loaded: {Path(path).name}", 
                     foreground="green"
@@ -286,8 +329,11 @@ class InvitationNameAdder:
         
         if path:
             try:
+                import fitz  # PyMuPDF
+                
                 self.pdf_path = path
                 self.pdf_doc = fitz.open(path)
+                self.preview.set_document(path, [page.rect for page in self.pdf_doc])
                 self.current_page = 0
                 self.positions = []
                 self.positions_listbox.delete(0, tk.END)
@@ -298,36 +344,30 @@ class InvitationNameAdder:
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load PDF:\n{str(e)}")
     
-    def display_page(self):
+    def display_page(self, delay_ms=0):
         if not self.pdf_doc:
             return
         
-        page = self.pdf_doc[self.current_page]
-        
-        # Render page to image
-        mat = fitz.Matrix(self.zoom * 2, self.zoom * 2)  # 2x for better quality
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Convert to PIL Image then to PhotoImage
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        self.photo = ImageTk.PhotoImage(img)
-        
-        # Update canvas
-        self.canvas.delete("all")
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
-        self.canvas.config(scrollregion=self.canvas.bbox("all"))
-        
-        # Draw markers for positions on current page
-        for pos in self.positions:
-            if pos[0] == self.current_page:
-                x, y = pos[1] * self.zoom * 2, pos[2] * self.zoom * 2
-                self.canvas.create_oval(x-10, y-10, x+10, y+10, 
-                                       fill='red', outline='white', width=2)
-                self.canvas.create_text(x, y-20, text="📝", font=('', 16))
+        # Rendered in the background; cached pages show at once
+        self.preview.show_page(self.current_page, self.zoom,
+                               prefetch=self.prefetch_views(), delay_ms=delay_ms)
+        self.draw_markers()
         
         # Update page label
         self.page_label.config(text=f"Page: {self.current_page + 1}/{len(self.pdf_doc)}")
     
+    def prefetch_views(self):
+        """Neighbouring pages and zoom levels to render ahead of time"""
+        views = [(page, self.zoom) for page in (self.current_page + 1, self.current_page - 1)
+                 if 0 <= page < len(self.pdf_doc)]
+        views += [(self.current_page, zoom) for zoom in (self.zoom + 0.2, self.zoom - 0.2)
+                  if 0.5 <= round(zoom, 2) <= 3.0]
+        return views
+    
+    def draw_markers(self):
+        """Redraw the markers; the preview shows those of the page on screen"""
+        self.preview.draw_markers(self.positions)
+    
     def on_canvas_click(self, event):
         if not self.pdf_doc:
             return
@@ -342,8 +382,12 @@ class InvitationNameAdder:
         canvas_x = self.canvas.canvasx(event.x)
         canvas_y = self.canvas.canvasy(event.y)
         
-        pdf_x = canvas_x / (self.zoom * 2)
-        pdf_y = canvas_y / (self.zoom * 2)
+        # Relative to the image on screen, which lags a debounced zoom;
+        # ignored until the current page's image is up
+        coords = self.preview.to_pdf(canvas_x, canvas_y)
+        if coords is None:
+            return
+        pdf_x, pdf_y = coords
         
         # Add position
         font_size = self.size_var.get()
@@ -353,8 +397,8 @@ class InvitationNameAdder:
         self.positions_listbox.insert(tk.END, 
             f"Page {self.current_page + 1}: ({int(pdf_x)}, {int(pdf_y)}) Size: {font_size}")
         
-        # Redraw to show marker
-        self.display_page()
+        # Draw the new marker over the cached page image
+        self.draw_markers()
         
         messagebox.showinfo("Position Added", 
                           f"Name position added on page {self.current_page + 1}")
@@ -365,7 +409,7 @@ class InvitationNameAdder:
             idx = selection[0]
             del self.positions[idx]
             self.positions_listbox.delete(idx)
-            self.display_page()
+            self.draw_markers()
     
     def prev_page(self):
         if self.pdf_doc and self.current_page > 0:
@@ -380,12 +424,12 @@ class InvitationNameAdder:
     def zoom_in(self):
         self.zoom = min(self.zoom + 0.2, 3.0)
         self.zoom_label.config(text=f"{int(self.zoom * 100)}%")
-        self.display_page()
+        self.display_page(delay_ms=ZOOM_DEBOUNCE_MS)
     
     def zoom_out(self):
         self.zoom = max(self.zoom - 0.2, 0.5)
         self.zoom_label.config(text=f"{int(self.zoom * 100)}%")
-        self.display_page()
+        self.display_page(delay_ms=ZOOM_DEBOUNCE_MS)
     
     def load_csv(self):
         path = filedialog.askopenfilename(
@@ -395,11 +439,12 @@ class InvitationNameAdder:
         
         if path:
             try:
-                # Validate CSV
-                with open(path, 'r', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    headers = next(reader)
-                    row_count = sum(1 for row in reader)
+                from invitation_engine import count_rows
+                
+                # Validate CSV header; count rows without parsing the whole file
+                with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                    headers = next(csv.reader(f))
+                row_count = count_rows(path)
                 
                 self.csv_path = path
                 self.csv_label.config(
@@ -410,124 +455,53 @@ class InvitationNameAdder:
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load CSV:\n{str(e)}")
     
-    # def add_text_to_pdf_page(self, pdf_page, text, x, y, font_size, color_rgb):
-    #     """Add text to PDF using image overlay method with proper text shaping for Gujarati"""
-    #     # Get page dimensions
-    #     page_rect = pdf_page.rect
-    #     page_width = page_rect.width
-    #     page_height = page_rect.height
-        
-    #     # Increase resolution for better quality
-    #     scale = 3 if self.rendering_var.get() == "quality" else 2
-        
-    #     # Create transparent image for text with higher resolution
-    #     img_width = int(page_width * scale)
-    #     img_height = int(page_height * scale)
-    #     text_img = Image.new('RGBA', (img_width, img_height), (255, 255, 255, 0))
-    #     draw = ImageDraw.Draw(text_img)
-        
-    #     # Load font with scaled size
-    #     try:
-    #         font = ImageFont.truetype(self.font_path, font_size * scale, layout_engine=ImageFont.Layout.RAQM)
-    #     except:
-    #         # Fallback to basic layout
-    #         font = ImageFont.truetype(self.font_path, font_size * scale)
-        
-    #     # Draw text at scaled position with proper text shaping
-    #     try:
-    #         # Use proper text layout for complex scripts
-    #         draw.text((x * scale, y * scale), text, font=font, fill=color_rgb, 
-    #                  features=['-liga', '-clig'])  # Enable ligatures
-    #     except:
-    #         # Fallback to basic drawing
-    #         draw.text((x * scale, y * scale), text, font=font, fill=color_rgb)
-        
-    #     # Resize back to original dimensions with high-quality resampling
-    #     text_img = text_img.resize((int(page_width), int(page_height)), Image.Resampling.LANCZOS)
-        
-    #     # Convert PIL image to bytes
-    #     img_buffer = io.BytesIO()
-    #     text_img.save(img_buffer, format='PNG')
-    #     img_buffer.seek(0)
-        
-    #     # Insert image into PDF
-    #     pdf_page.insert_image(page_rect, stream=img_buffer.getvalue(), overlay=True)
-
-    def add_text_to_pdf_page(self, pdf_page, text, x, y, font_size, color_rgb):
+    def create_engine(self, on_ready, on_failed=None):
         """
-        Add Gujarati text to PDF correctly using WeasyPrint (handles shaping like 'શ્રી').
-        Works directly with PyMuPDF (fitz) page object.
+        Build a headless engine from the current font, template, positions and
+        colour on a background thread, then call on_ready(engine) on the Tk
+        thread; on_failed() follows the error message if it cannot be built
         """
-        # Handle RGB or RGBA
-        if len(color_rgb) == 4:
-            r, g, b, a = color_rgb
-            a = a / 255.0
-            color_css = f"rgba({r},{g},{b},{a})"
-        else:
-            r, g, b = color_rgb
-            color_css = f"rgb({r},{g},{b})"
-
-        # Get page size
-        page_rect = pdf_page.rect
-        page_width = int(page_rect.width)
-        page_height = int(page_rect.height)
-
-        # Build HTML for WeasyPrint
-        html_content = f"""
-        <html>
-        <head>
-            <meta charset="utf-8" />
-            <style>
-                @font-face {{
-                    font-family: "GujaratiFont";
-                    src: url("file://{self.font_path}");
-                }}
-                html, body {{
-                    margin: 0; padding: 0;
-                    width: {page_width}px; height: {page_height}px;
-                    background: transparent;
-                }}
-                .text {{
-                    position: absolute;
-                    left: {x}px;
-                    bottom: {y}px;
-                    font-family: "GujaratiFont", sans-serif;
-                    font-size: {font_size}px;
-                    color: {color_css};
-                    white-space: pre;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="text">{text}</div>
-        </body>
-        </html>
-        """
-
-        # Render HTML -> PDF (WeasyPrint)
-        pdf_buffer = io.BytesIO()
-        HTML(string=html_content).write_pdf(pdf_buffer)
-        pdf_buffer.seek(0)
-
-        # Open the overlay as PyMuPDF document
-        overlay_doc = fitz.open(stream=pdf_buffer.getvalue(), filetype="pdf")
-        overlay_page = overlay_doc.load_page(0)
-
-        # Render overlay page to PNG (to preserve complex text correctly)
-        pix = overlay_page.get_pixmap(alpha=True)
-        img_bytes = pix.tobytes("png")
-
-        # Insert PNG image onto existing PDF page
-        pdf_page.insert_image(
-            pdf_page.rect,  # full-page overlay
-            stream=img_bytes,  # PNG data
-            keep_proportion=False,
-            overlay=True
-        )
-
-        overlay_doc.close()
-
-
+        from invitation_engine import InvitationEngine
+        
+        # Read the settings here: Tk variables belong to the Tk thread
+        args = (self.pdf_path, self.font_path, list(self.positions))
+        # Output files keep the spaces of guest names, as they always have here
+        options = {"color": self.color_var.get(), "engine": self.engine_var.get(),
+                   "rendering": self.rendering_var.get(), "overlay_cache": self.cache_var.get(),
+                   "name_separator": " "}
+        outcome = {}
+        
+        def build():
+            # The first use of a font and template calibrates the engines, which takes a few seconds
+            try:
+                outcome["engine"] = InvitationEngine(*args, **options)
+            except Exception as e:
+                outcome["error"] = e
+        
+        def check():
+            if thread.is_alive():
+                self.root.after(ENGINE_POLL_MS, check)
+                return
+            self.root.config(cursor="")
+            if "error" in outcome:
+                messagebox.showerror("Error", f"Failed to prepare the text engine:\n{outcome['error']}")
+                if on_failed is not None:
+                    on_failed()
+            else:
+                self.show_engine(outcome["engine"])
+                on_ready(outcome["engine"])
+        
+        self.root.config(cursor="watch")
+        thread = threading.Thread(target=build, daemon=True)
+        thread.start()
+        self.root.after(ENGINE_POLL_MS, check)
+    
+    def show_engine(self, engine):
+        """Show which engine renders the names, and whether calibration picked it"""
+        text = f"In use: {engine.options['engine']}"
+        if engine.calibration is not None:
+            text += " (picked by auto)"
+        self.engine_label.config(text=text)
     
     def test_sample(self):
         """Test with a sample name to check font rendering"""
@@ -563,41 +537,32 @@ class InvitationNameAdder:
                 messagebox.showwarning("Warning", "Please enter a sample name!")
                 return
             
+            # Select output location
+            output_path = filedialog.asksaveasfilename(
+                defaultextension=".pdf",
+                filetypes=[("PDF files", "*.pdf")],
+                initialfile="test_invitation.pdf"
+            )
+            
+            if not output_path:
+                return
+            
+            # The engine may take a few seconds to calibrate; one test at a time
+            test_button.config(state="disabled")
+            self.create_engine(lambda engine: save_test(engine, sample_name, output_path),
+                               on_failed=enable_test)
+        
+        def enable_test():
+            if test_window.winfo_exists():
+                test_button.config(state="normal")
+        
+        def save_test(engine, sample_name, output_path):
+            if test_window.winfo_exists():
+                test_window.destroy()
+            
             try:
-                # Select output location
-                output_path = filedialog.asksaveasfilename(
-                    defaultextension=".pdf",
-                    filetypes=[("PDF files", "*.pdf")],
-                    initialfile="test_invitation.pdf"
-                )
-                
-                if not output_path:
-                    return
-                
                 # Create test PDF
-                doc = fitz.open(self.pdf_path)
-                
-                color_name = self.color_var.get()
-                color_map = {
-                    'black': (0, 0, 0, 255),
-                    'red': (255, 0, 0, 255),
-                    'blue': (0, 0, 255, 255),
-                    'gold': (255, 215, 0, 255),
-                    'green': (0, 128, 0, 255),
-                    'maroon': (128, 0, 0, 255)
-                }
-                text_color = color_map.get(color_name, (0, 0, 0, 255))
-                
-                # Add name to each position
-                for pos in self.positions:
-                    page_num, x, y, size = pos
-                    page = doc[page_num]
-                    self.add_text_to_pdf_page(page, sample_name, x, y, size, text_color)
-                
-                doc.save(output_path)
-                doc.close()
-                
-                test_window.destroy()
+                engine.save_invitation(sample_name, output_path)
                 
                 result = messagebox.askyesno("Test Complete", 
                     f"Test invitation saved to:\n{output_path}\n\n"
@@ -618,8 +583,9 @@ class InvitationNameAdder:
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to generate test:\n{str(e)}")
         
-        ttk.Button(test_window, text="Generate Test PDF", 
-                  command=generate_test).pack(pady=10)
+        test_button = ttk.Button(test_window, text="Generate Test PDF", 
+                                 command=generate_test)
+        test_button.pack(pady=10)
     
     def generate_invitations(self):
         if not self.pdf_path:
@@ -652,76 +618,26 @@ class InvitationNameAdder:
             return
         
         try:
-            # Read guest names
-            with open(self.csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                guests = list(reader)
+            from invitation_engine import count_rows
+            from progress_dialog import GenerationDialog
             
-            if not guests:
+            # Count guests for the progress bar; names are streamed while generating
+            total = count_rows(self.csv_path)
+            if not total:
                 messagebox.showerror("Error", "CSV file is empty!")
                 return
             
             # Check for 'name' column
-            if 'name' not in guests[0]:
+            with open(self.csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+                headers = next(csv.reader(f), [])
+            if 'name' not in headers:
                 messagebox.showerror("Error", 
                     "CSV must have a 'name' column!\n\nExample CSV format:\nname\nશ્રી રાજેશભાઈ\nશ્રીમતી સીતાબેન")
                 return
             
-            # Generate invitations
-            progress = tk.Toplevel(self.root)
-            progress.title("Generating Invitations")
-            progress.geometry("400x150")
-            progress.transient(self.root)
-            progress.grab_set()
-            
-            ttk.Label(progress, text="Generating invitations...", 
-                     font=('', 12)).pack(pady=20)
-            
-            progress_var = tk.DoubleVar()
-            progress_bar = ttk.Progressbar(progress, variable=progress_var, 
-                                          maximum=len(guests), length=300)
-            progress_bar.pack(pady=10)
-            
-            status_label = ttk.Label(progress, text="")
-            status_label.pack(pady=5)
-            
-            color_name = self.color_var.get()
-            color_map = {
-                'black': (0, 0, 0, 255),
-                'red': (255, 0, 0, 255),
-                'blue': (0, 0, 255, 255),
-                'gold': (255, 215, 0, 255),
-                'green': (0, 128, 0, 255),
-                'maroon': (128, 0, 0, 255)
-            }
-            text_color = color_map.get(color_name, (0, 0, 0, 255))
-            
-            for i, guest in enumerate(guests):
-                guest_name = guest['name']
-                status_label.config(text=f"Processing: {guest_name}")
-                progress.update()
-                
-                # Create new PDF
-                doc = fitz.open(self.pdf_path)
-                
-                # Add name to each position
-                for pos in self.positions:
-                    page_num, x, y, size = pos
-                    page = doc[page_num]
-                    self.add_text_to_pdf_page(page, guest_name, x, y, size, text_color)
-                
-                # Save
-                safe_name = "".join(c for c in guest_name if c.isalnum() or c in (' ', '_', '-'))
-                output_path = os.path.join(output_dir, f"invitation_{safe_name}.pdf")
-                doc.save(output_path)
-                doc.close()
-                
-                progress_var.set(i + 1)
-            
-            progress.destroy()
-            
-            messagebox.showinfo("Success", 
-                f"✅ Generated {len(guests)} invitations!\n\nSaved to: {output_dir}")
+            # Runs in the background; the dialog reports progress and the outcome
+            self.create_engine(lambda engine: GenerationDialog(self.root, engine, self.csv_path,
+                                                               output_dir, total))
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate invitations:\n{str(e)}")
@@ -0,0 +1,462 @@
+"""
+Template preview for the GUIs.
+
+Renders PDF pages onto the Tk canvas and keeps recently shown pages, so that
+adding or removing a name position, flipping back to a page or returning to
+a zoom level does not rasterise the page again. Name markers are separate
+canvas items drawn on top of the page image, and only ever show the
+positions of the page whose image is on the canvas.
+
+Pages are rasterised by a child process: PyMuPDF holds the GIL while it
+renders, so a thread would still freeze the window on large photo
+templates. A quick low-resolution render is shown first and swapped for the
+sharp one when it arrives; neighbouring pages and zoom levels are rendered
+ahead of time, and renders for views the user has already left are dropped.
+
+At high zoom a whole page would take tens of megabytes, so large views are
+cut into tiles: only the tiles around the visible part of the canvas are
+rendered (clipped), and more follow as the user scrolls. Memory and render
+time then depend on the window size rather than on the zoom level.
+
+PyMuPDF and Pillow are imported on first use, so creating a PagePreview
+does not hold up the window appearing.
+"""
+import collections
+import math
+import multiprocessing
+import queue
+import tkinter as tk
+
+# Preview pixels per PDF point at 100% zoom (2x for better quality)
+PREVIEW_SCALE = 2
+
+# Pixels of rendered pages kept in memory. Tk holds 4 bytes per pixel, so
+# this is about 100 MB: a dozen A4 pages at 100%, or one page at 300%.
+PREVIEW_CACHE_PIXELS = 24_000_000
+
+# Only prefetch views that take at most this share of the cache
+PREFETCH_SHARE = 0.25
+
+# The quick stand-in is rendered at this fraction of the final resolution
+LOW_RES_FACTOR = 0.25
+
+# How often the Tk thread collects finished renders
+POLL_MS = 30
+
+# How long closing waits for the render process before killing it
+CLOSE_TIMEOUT_S = 1.0
+
+# Wait this long after a zoom click before rendering, so rapid clicks render once
+ZOOM_DEBOUNCE_MS = 250
+
+# Edge of a square preview tile in pixels
+TILE_SIZE = 512
+
+# Tiles beyond the visible ones rendered ahead of scrolling, on each side
+TILE_MARGIN = 1
+
+# key is (page_num, rounded zoom), plus (col, row) for tiles; generation
+# tells stale jobs apart; clip is the tile's pixel rect, or None for the page
+RenderJob = collections.namedtuple("RenderJob", "key page_num scale generation low_res clip",
+                                   defaults=(None,))
+
+
+class LRUCache:
+    """Least recently used cache bounded by the total cost of its values"""
+
+    def __init__(self, max_cost):
+        self.max_cost = max_cost
+        self.total_cost = 0
+        self.items = collections.OrderedDict()
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key][0]
+
+    def put(self, key, value, cost=1):
+        if key in self.items:
+            self.total_cost -= self.items.pop(key)[1]
+        self.items[key] = (value, cost)
+        self.total_cost += cost
+
+        # Always keep the newest value, even if it alone is over budget
+        while self.total_cost > self.max_cost and len(self.items) > 1:
+            _, (_, old_cost) = self.items.popitem(last=False)
+            self.total_cost -= old_cost
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def clear(self):
+        self.items.clear()
+        self.total_cost = 0
+
+
+def render_page(page, scale):
+    """Rasterise a PDF page to an RGB PIL image at `scale` pixels per point"""
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+
+def render_tile(page, scale, clip):
+    """Rasterise the (x0, y0, x1, y1) pixel rect of a page at `scale`"""
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    x0, y0, x1, y1 = clip
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=fitz.Rect(clip) / scale)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    # Rounding can leave a pixel over or under; tiles must butt up exactly
+    if img.size != (x1 - x0, y1 - y0):
+        img = img.resize((x1 - x0, y1 - y0), Image.Resampling.BILINEAR)
+    return img
+
+
+def render_job(page, job):
+    """Image for a RenderJob; low-res jobs are stretched to the final size"""
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    if job.clip is not None:
+        return render_tile(page, job.scale, job.clip)
+    if not job.low_res:
+        return render_page(page, job.scale)
+    size = (page.rect * fitz.Matrix(job.scale, job.scale)).irect
+    img = render_page(page, job.scale * LOW_RES_FACTOR)
+    return img.resize((size.width, size.height), Image.Resampling.BILINEAR)
+
+
+def _render_loop(jobs, results, generation):
+    """Child process: open the PDF and render jobs until told to stop"""
+    import fitz  # PyMuPDF
+
+    doc = None
+    while True:
+        message = jobs.get()
+        if message is None:
+            return
+
+        kind, payload = message
+        if kind == "open":
+            if doc is not None:
+                doc.close()
+            doc = fitz.open(payload)
+            continue
+
+        job = payload
+        img = None
+        # Skip views the user has already left
+        if doc is not None and job.generation == generation.value:
+            try:
+                img = render_job(doc[job.page_num], job)
+            except Exception:
+                img = None
+        results.put((job, img))
+
+
+class RenderWorker:
+    """A child process that rasterises pages of one PDF"""
+
+    def __init__(self):
+        # spawn: never fork a process that has Tk loaded
+        context = multiprocessing.get_context("spawn")
+        self.jobs = context.Queue()
+        self.results = context.Queue()
+        self.generation = context.Value("i", 0, lock=False)
+        self.process = context.Process(target=_render_loop,
+                                       args=(self.jobs, self.results, self.generation),
+                                       daemon=True)
+        self.process.start()
+
+    def open(self, pdf_path):
+        self.jobs.put(("open", pdf_path))
+
+    def render(self, job):
+        self.jobs.put(("render", job))
+
+    def cancel(self):
+        """Drop every queued job; returns the generation for new jobs"""
+        self.generation.value += 1
+        return self.generation.value
+
+    def close(self):
+        """Stop the child process, dropping queued jobs"""
+        self.cancel()
+        self.jobs.put(None)
+        # Unread results can keep the child from exiting
+        self.process.join(CLOSE_TIMEOUT_S)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class PagePreview:
+    """Shows one page of a PDF and its name markers on a Tk canvas"""
+
+    def __init__(self, canvas, cache_pixels=PREVIEW_CACHE_PIXELS):
+        self.canvas = canvas
+        self.cache = LRUCache(cache_pixels)
+        self.worker = None
+        self.photo = None
+        self.page_rects = []
+
+        self.current = None     # (page_num, zoom) the user asked for
+        self.shown = None       # key of the sharp image on the canvas, if any
+        self.shown_page = None  # page of whatever image is on the canvas
+        self.shown_zoom = None  # zoom of whatever image is on the canvas
+        self.tiled = False      # whether the current view is drawn as tiles
+        self.tiles = {}         # tile key -> (canvas item, photo) around the viewport
+        self.requested = set()  # tile keys queued in the current generation
+        self.generation = 0
+        self.markers = []
+        self.pending = 0
+        self._debounce = None
+        self._poll = None
+        self._view_update = None
+
+    def follow_view(self, h_scrollbar, v_scrollbar):
+        """Connect the canvas scrollbars; tiles are rendered as the view scrolls or resizes"""
+        def xscroll(*args):
+            h_scrollbar.set(*args)
+            self.view_changed()
+
+        def yscroll(*args):
+            v_scrollbar.set(*args)
+            self.view_changed()
+
+        self.canvas.configure(xscrollcommand=xscroll, yscrollcommand=yscroll)
+
+    def set_document(self, pdf_path, page_rects):
+        """Switch to a newly loaded PDF, forgetting the old one's pages"""
+        import fitz  # PyMuPDF
+
+        if self.worker is None:
+            self.worker = RenderWorker()
+        self.generation = self.worker.cancel()
+        self.worker.open(pdf_path)
+        self.page_rects = [fitz.Rect(rect) for rect in page_rects]
+        self.cache.clear()
+        self.current = None
+        self.shown = None
+        # The old document's image stays up until the new one arrives, unmarked
+        self.set_view(None, None)
+        self.tiled = False
+        self.tiles = {}
+        self.requested.clear()
+
+    def page_pixels(self, page_num, zoom):
+        """(width, height) in pixels of a page rendered at `zoom`"""
+        import fitz  # PyMuPDF
+
+        scale = zoom * PREVIEW_SCALE
+        size = (self.page_rects[page_num] * fitz.Matrix(scale, scale)).irect
+        return size.width, size.height
+
+    def fits_whole(self, page_num, zoom):
+        """Whether a page at `zoom` is rendered in one piece rather than as tiles"""
+        width, height = self.page_pixels(page_num, zoom)
+        return width * height <= self.cache.max_cost * PREFETCH_SHARE
+
+    def show_page(self, page_num, zoom, prefetch=(), delay_ms=0):
+        """
+        Show `page_num` at `zoom`. A cached image is drawn at once; otherwise
+        a low-resolution stand-in comes first and the sharp image replaces
+        it. Views too large to keep whole are drawn as tiles around the
+        viewport instead. `prefetch` lists (page_num, zoom) views to render
+        afterwards. With `delay_ms` the request only runs if no other
+        request arrives within that time (debounce).
+        """
+        if self._debounce is not None:
+            self.canvas.after_cancel(self._debounce)
+            self._debounce = None
+        if delay_ms:
+            self._debounce = self.canvas.after(delay_ms, self.show_page, page_num, zoom, prefetch)
+            return
+
+        # Zoom steps of 0.2 accumulate float error; 1.2 must hit the same entry
+        self.current = (page_num, round(zoom, 2))
+        self.generation = self.worker.cancel()
+        self.requested.clear()
+
+        if not self.fits_whole(page_num, zoom):
+            self.show_tiles()
+        else:
+            photo = self.cache.get(self.current)
+            if photo is not None:
+                self.draw(photo, self.current)
+            else:
+                self.submit(RenderJob(self.current, page_num, zoom * PREVIEW_SCALE, self.generation, True))
+                self.submit(RenderJob(self.current, page_num, zoom * PREVIEW_SCALE, self.generation, False))
+
+        for view_page, view_zoom in prefetch:
+            key = (view_page, round(view_zoom, 2))
+            if key not in self.cache and self.fits_whole(view_page, view_zoom):
+                self.submit(RenderJob(key, view_page, view_zoom * PREVIEW_SCALE, self.generation, False))
+
+    def show_tiles(self):
+        """Switch the canvas to the tiles of the current view"""
+        width, height = self.page_pixels(*self.current)
+        self.photo = None
+        self.shown = None
+        self.tiled = True
+        self.tiles = {}
+
+        self.canvas.delete("page")
+        self.canvas.config(scrollregion=(0, 0, width, height))
+        self.set_view(*self.current)
+        self.update_tiles()
+
+    def view_changed(self):
+        if self.tiled and self._view_update is None:
+            self._view_update = self.canvas.after_idle(self.update_tiles)
+
+    def update_tiles(self):
+        """Draw cached tiles around the viewport and queue renders for the missing ones"""
+        self._view_update = None
+        if not self.tiled:
+            return
+
+        page_num, zoom = self.current
+        width, height = self.page_pixels(page_num, zoom)
+        left, top = int(self.canvas.canvasx(0)), int(self.canvas.canvasy(0))
+        right, bottom = left + self.canvas.winfo_width(), top + self.canvas.winfo_height()
+
+        cols = range(max(left // TILE_SIZE - TILE_MARGIN, 0),
+                     min(math.ceil(right / TILE_SIZE) + TILE_MARGIN, math.ceil(width / TILE_SIZE)))
+        rows = range(max(top // TILE_SIZE - TILE_MARGIN, 0),
+                     min(math.ceil(bottom / TILE_SIZE) + TILE_MARGIN, math.ceil(height / TILE_SIZE)))
+        wanted = {(page_num, zoom, col, row) for col in cols for row in rows}
+
+        # Let go of tiles that scrolled out of reach
+        for key in list(self.tiles):
+            if key not in wanted:
+                self.canvas.delete(self.tiles.pop(key)[0])
+
+        # Visible tiles first, the margin after them
+        centre_col = (left + right) / 2 / TILE_SIZE
+        centre_row = (top + bottom) / 2 / TILE_SIZE
+        for key in sorted(wanted, key=lambda key: abs(key[2] + 0.5 - centre_col)
+                                                  + abs(key[3] + 0.5 - centre_row)):
+            if key in self.tiles:
+                continue
+            photo = self.cache.get(key)
+            if photo is not None:
+                self.draw_tile(key, photo)
+            elif key not in self.requested:
+                self.requested.add(key)
+                col, row = key[2:]
+                clip = (col * TILE_SIZE, row * TILE_SIZE,
+                        min((col + 1) * TILE_SIZE, width), min((row + 1) * TILE_SIZE, height))
+                self.submit(RenderJob(key, page_num, zoom * PREVIEW_SCALE, self.generation, False, clip))
+
+    def submit(self, job):
+        self.worker.render(job)
+        self.pending += 1
+        if self._poll is None:
+            self._poll = self.canvas.after(POLL_MS, self.poll)
+
+    def poll(self):
+        """Take finished renders from the worker (runs on the Tk thread)"""
+        from PIL import ImageTk
+
+        self._poll = None
+        while True:
+            try:
+                job, img = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if job.generation == self.generation:
+                self.requested.discard(job.key)
+            if img is None:
+                continue
+
+            if job.low_res:
+                # Stand-in until the sharp render of the same view arrives
+                if job.key == self.current and self.shown != self.current:
+                    self.draw(ImageTk.PhotoImage(img), job.key, sharp=False)
+                continue
+
+            photo = ImageTk.PhotoImage(img)
+            self.cache.put(job.key, photo, img.width * img.height)
+            if job.clip is not None:
+                if self.tiled and job.key[:2] == self.current and job.key not in self.tiles:
+                    self.draw_tile(job.key, photo)
+            elif job.key == self.current:
+                self.draw(photo, job.key)
+
+        if self.pending > 0:
+            self._poll = self.canvas.after(POLL_MS, self.poll)
+
+    def draw(self, photo, key, sharp=True):
+        """Put a page image under the markers"""
+        self.photo = photo
+        self.shown = key if sharp else None
+        self.tiled = False
+        self.tiles = {}
+
+        self.canvas.delete("page")
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=photo, tags="page")
+        self.canvas.tag_lower("page")
+        self.canvas.config(scrollregion=(0, 0, photo.width(), photo.height()))
+        self.set_view(*key)
+
+    def draw_tile(self, key, photo):
+        """Put one tile of the current view under the markers"""
+        col, row = key[2:]
+        item = self.canvas.create_image(col * TILE_SIZE, row * TILE_SIZE, anchor=tk.NW,
+                                        image=photo, tags="page")
+        self.canvas.tag_lower(item)
+        # Keep the photo alive even if the cache evicts it
+        self.tiles[key] = (item, photo)
+
+    def set_view(self, page_num, zoom):
+        """Record the page and zoom of the image on the canvas, moving the markers with it"""
+        if (page_num, zoom) != (self.shown_page, self.shown_zoom):
+            self.shown_page = page_num
+            self.shown_zoom = zoom
+            self.draw_markers(self.markers)
+
+    def draw_markers(self, positions):
+        """
+        Redraw the markers of the (page, x, y, font_size) positions that lie
+        on the page shown. Positions of a page that is still being rendered
+        appear once its image is on the canvas.
+        """
+        self.markers = list(positions)
+        self.canvas.delete("marker")
+        if self.shown_zoom is None:
+            return
+        for pos in self.markers:
+            if pos[0] != self.shown_page:
+                continue
+            x, y = pos[1] * self.shown_zoom * PREVIEW_SCALE, pos[2] * self.shown_zoom * PREVIEW_SCALE
+            self.canvas.create_oval(x-10, y-10, x+10, y+10,
+                                    fill='red', outline='white', width=2, tags="marker")
+            self.canvas.create_text(x, y-20, text="📝", font=('', 16), tags="marker")
+
+    def to_pdf(self, canvas_x, canvas_y):
+        """
+        PDF coordinates of a canvas point on the image shown, or None while
+        the canvas does not show the requested page yet (e.g. just after
+        turning the page). The zoom may still lag a debounced zoom change.
+        """
+        if self.shown_zoom is None or self.current is None or self.shown_page != self.current[0]:
+            return None
+        scale = self.shown_zoom * PREVIEW_SCALE
+        return canvas_x / scale, canvas_y / scale
+
+    def close(self):
+        """Stop rendering, e.g. when the window closes"""
+        for callback in (self._debounce, self._poll, self._view_update):
+            if callback is not None:
+                self.canvas.after_cancel(callback)
+        self._debounce = self._poll = self._view_update = None
+        if self.worker is not None:
+            self.worker.close()
+            self.worker = None
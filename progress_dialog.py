@@ -0,0 +1,194 @@
+"""
+Batch generation progress dialog for the GUIs.
+
+generate() runs on a background thread so the window can still be moved,
+redrawn and cancelled while a batch is rendering. The thread only passes
+messages to a queue that the Tk thread reads with after(); it never touches
+a widget. The rendering itself is done by worker processes (generate() with
+background=True), because PyMuPDF and WeasyPrint hold the GIL while they
+work and would otherwise stall the window from the thread.
+"""
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from invitation_engine import iter_guest_names
+
+# How often the Tk thread collects messages from the generation thread
+POLL_MS = 100
+
+# Guests per batch: small enough that progress moves steadily and Cancel
+# only waits for a few guests per worker
+BATCH_SIZE = 16
+
+# Order the stages are shown in
+STAGES = ("open", "render", "save")
+
+
+def format_duration(seconds):
+    """1:05 or 1:02:05"""
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class GenerationDialog:
+    """
+    Generates every guest of `csv_path` into `output_dir` with `engine`,
+    showing progress, throughput, ETA and stage timings, with a Cancel
+    button that stops after the batches being rendered. A summary is shown when it ends.
+    """
+
+    def __init__(self, parent, engine, csv_path, output_dir, total):
+        self.parent = parent
+        self.engine = engine
+        self.csv_path = csv_path
+        self.output_dir = output_dir
+        self.total = total
+
+        self.messages = queue.Queue()
+        self.cancel = threading.Event()
+        self.failures = []
+        self.skipped = []
+        self.completed = 0
+        self.reused = 0
+        self.stage_times = {}
+        self.started = time.perf_counter()
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Generating Invitations")
+        self.window.geometry("420x230")
+        self.window.transient(parent)
+        self.window.grab_set()
+        self.window.protocol("WM_DELETE_WINDOW", self.request_cancel)
+
+        ttk.Label(self.window, text="Generating invitations...",
+                  font=('', 12)).pack(pady=(15, 10))
+
+        self.progress_var = tk.DoubleVar()
+        ttk.Progressbar(self.window, variable=self.progress_var,
+                        maximum=total, length=320).pack(pady=5)
+
+        self.status_label = ttk.Label(self.window, text="Starting...")
+        self.status_label.pack(pady=2)
+        self.rate_label = ttk.Label(self.window, text="")
+        self.rate_label.pack(pady=2)
+        self.stage_label = ttk.Label(self.window, text="", foreground="gray")
+        self.stage_label.pack(pady=2)
+
+        self.cancel_button = ttk.Button(self.window, text="Cancel", command=self.request_cancel)
+        self.cancel_button.pack(pady=10)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.window.after(POLL_MS, self.poll)
+
+    def run(self):
+        """Generation thread: report everything through the message queue"""
+        try:
+            guest_names = iter_guest_names(
+                self.csv_path, on_malformed=lambda line, message: self.messages.put(
+                    ("malformed", f"Line {line}: {message}")))
+            output_paths = self.engine.generate(
+                guest_names, self.output_dir, workers=None, batch_size=BATCH_SIZE,
+                total=self.total,
+                progress=lambda completed, total, guest_name: self.messages.put(
+                    ("progress", completed, guest_name)),
+                on_error=lambda index, guest_name, message: self.messages.put(
+                    ("failed", f"{guest_name}: {message}")),
+                on_reused=lambda index, guest_name: self.messages.put(("reused",)),
+                on_stage_times=lambda stage_times: self.messages.put(("stages", stage_times)),
+                cancel=self.cancel, background=True)
+        except Exception as e:
+            self.messages.put(("error", str(e)))
+        else:
+            self.messages.put(("done", output_paths))
+
+    def request_cancel(self):
+        """Stop after the batches being written; finished files are kept"""
+        self.cancel.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Cancelling after the current guests...")
+
+    def poll(self):
+        """Apply the generation thread's messages to the dialog (runs on the Tk thread)"""
+        last_guest = None
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+
+            kind = message[0]
+            if kind == "progress":
+                self.completed, last_guest = message[1:]
+            elif kind == "reused":
+                self.reused += 1
+            elif kind == "stages":
+                for stage, (seconds, _) in message[1]["stages"].items():
+                    self.stage_times[stage] = self.stage_times.get(stage, 0) + seconds
+            elif kind == "failed":
+                self.failures.append(message[1])
+            elif kind == "malformed":
+                self.skipped.append(message[1])
+            elif kind == "done":
+                self.finish(message[1])
+                return
+            elif kind == "error":
+                self.window.destroy()
+                messagebox.showerror("Error", f"Failed to generate invitations:\n{message[1]}")
+                return
+
+        if last_guest is not None:
+            self.progress_var.set(self.completed)
+            if not self.cancel.is_set():
+                self.status_label.config(text=f"Generated: {last_guest}")
+            self.update_rates()
+        self.window.after(POLL_MS, self.poll)
+
+    def update_rates(self):
+        """Show guests/sec, ETA and the average time per guest of each stage"""
+        # Reused guests cost nothing and would make the rate look too good
+        rendered = self.completed - self.reused
+        elapsed = time.perf_counter() - self.started
+        if rendered <= 0 or elapsed <= 0:
+            return
+
+        rate = rendered / elapsed
+        text = f"{self.completed}/{self.total}  ·  {rate:.1f} guests/sec"
+        remaining = self.total - self.completed
+        if remaining > 0:
+            text += f"  ·  ETA {format_duration(remaining / rate)}"
+        self.rate_label.config(text=text)
+
+        parts = [f"{stage} {self.stage_times[stage] * 1000 / rendered:.0f} ms"
+                 for stage in STAGES if stage in self.stage_times]
+        if parts:
+            self.stage_label.config(text="Per guest: " + ", ".join(parts))
+
+    def finish(self, output_paths):
+        """Close the dialog and summarise the run"""
+        self.window.destroy()
+
+        generated = sum(1 for path in output_paths if path is not None)
+        # The row count is approximate, so also allow for skipped rows
+        if self.cancel.is_set() and self.completed + len(self.skipped) < self.total:
+            messagebox.showinfo("Cancelled",
+                f"Generated {generated} of {self.total} invitations before cancelling.\n\n"
+                "Generating again into the same folder continues where this run stopped.")
+            return
+
+        if self.failures or self.skipped:
+            messagebox.showwarning("Finished with Errors",
+                f"Generated {generated} of {len(output_paths)} invitations.\n\n"
+                + ("Failed:\n" + "\n".join(self.failures[:10]) + "\n\n" if self.failures else "")
+                + (f"Skipped {len(self.skipped)} malformed CSV rows:\n" + "\n".join(self.skipped[:10])
+                   if self.skipped else ""))
+            return
+
+        messagebox.showinfo("Success",
+            f"✅ Generated {generated} invitations!\n\nSaved to: {self.output_dir}")
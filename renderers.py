@@ -0,0 +1,773 @@
+"""
+Text renderers that stamp guest names onto PDF pages.
+
+Each renderer shapes Gujarati text (conjuncts like શ્રી, ક્ષ, જ્ઞ) and works
+directly with a PyMuPDF (fitz) page object. Nothing here imports tkinter,
+so the renderers can be used from the GUI, the command line or a script.
+"""
+import functools
+import html
+import importlib
+import io
+import math
+import os
+import pathlib
+
+import fitz  # PyMuPDF
+import PIL.features
+
+from PIL import Image, ImageDraw, ImageFont
+
+from overlay_cache import file_digest, make_key
+from timing import stage
+
+# Text colours offered in the GUI (RGBA)
+COLOR_MAP = {
+    'black': (0, 0, 0, 255),
+    'red': (255, 0, 0, 255),
+    'blue': (0, 0, 255, 255),
+    'gold': (255, 215, 0, 255),
+    'green': (0, 128, 0, 255),
+    'maroon': (128, 0, 0, 255)
+}
+
+# Parsed Pillow fonts kept per process; a batch only uses a few sizes
+FONT_CACHE_SIZE = 32
+
+# Transparent border in points around a Pillow overlay: the Lanczos filter
+# that downscales it reaches 3 pixels, so the ink comes out exactly as in a
+# full-page image
+OVERLAY_MARGIN = 3
+
+# Boxes on one page share an image while it is at most this many times the
+# area of the boxes themselves; names far apart (e.g. on opposite corners)
+# get an image each instead of one that covers most of the page
+CLUSTER_SLACK = 2
+
+
+def font_identity(font_path):
+    """Identify a font file by path, size and modification time"""
+    stat = os.stat(font_path)
+    return (os.path.abspath(font_path), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_truetype(identity, font_size, scale, layout_engine):
+    """Load (or reuse) a Pillow font at font_size * scale pixels"""
+    font_path = identity[0]
+    try:
+        return ImageFont.truetype(font_path, font_size * scale, layout_engine=layout_engine)
+    except:
+        # Fallback to basic layout
+        return ImageFont.truetype(font_path, font_size * scale)
+
+
+def font_cache_info():
+    """Hit/miss counters of the Pillow font cache in this process"""
+    return load_truetype.cache_info()
+
+
+def clear_font_cache():
+    """Forget every cached font, e.g. after a new font file was picked"""
+    load_truetype.cache_clear()
+
+
+def css_color(color_rgb):
+    """CSS colour for an RGB or RGBA tuple"""
+    # Handle RGB or RGBA
+    if len(color_rgb) == 4:
+        r, g, b, a = color_rgb
+        a = a / 255.0
+        return f"rgba({r},{g},{b},{a})"
+    r, g, b = color_rgb
+    return f"rgb({r},{g},{b})"
+
+
+def overlay_key(text, placements, color_rgb):
+    """
+    Key of one page's overlay, and the offset it is keyed relative to.
+    Overlays that differ only by a whole-point offset render to the same
+    pixels, so they are keyed relative to the first placement's whole point.
+    """
+    offset = fitz.Point(math.floor(placements[0][0]), math.floor(placements[0][1]))
+    key = (text, tuple(color_rgb),
+           tuple((round(x - offset.x, 6), round(y - offset.y, 6), size) for x, y, size in placements))
+    return key, offset
+
+
+def cluster_rects(rects):
+    """
+    Group rects that are worth drawing as one image, returning
+    [(union rect, [indexes into rects]), ...]. Two groups are merged when
+    they overlap or their union is at most CLUSTER_SLACK times their area.
+    """
+    clusters = [(fitz.Rect(rect), abs(rect), [index]) for index, rect in enumerate(rects)]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(clusters)):
+            for j in range(i + 1, len(clusters)):
+                rect_i, area_i, members_i = clusters[i]
+                rect_j, area_j, members_j = clusters[j]
+                union = rect_i | rect_j
+                if rect_i.intersects(rect_j) or abs(union) <= CLUSTER_SLACK * (area_i + area_j):
+                    clusters[i] = (union, area_i + area_j, members_i + members_j)
+                    del clusters[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [(rect, members) for rect, _, members in clusters]
+
+
+def page_size(pdf_page):
+    """(width, height) of a page in points"""
+    return (pdf_page.rect.width, pdf_page.rect.height)
+
+
+def group_by_page(positions):
+    """Map page -> [(x, y, font_size), ...], keeping the order positions were added in"""
+    by_page = {}
+    for pos in positions:
+        page_num, x, y, size = pos
+        by_page.setdefault(page_num, []).append((x, y, size))
+    return by_page
+
+
+# Engine name -> renderer class, filled in by @register in definition order
+RENDERERS = {}
+
+# Engine name that picks one of RENDERERS by calibration (see calibration.py)
+AUTO = "auto"
+
+
+def register(cls):
+    """Class decorator making a Renderer subclass available under its `name`"""
+    if not cls.name or cls.name == AUTO:
+        raise ValueError(f"{cls.__name__} needs a name other than '{AUTO}'")
+    if cls.name in RENDERERS:
+        raise ValueError(f"An engine named '{cls.name}' is already registered")
+    RENDERERS[cls.name] = cls
+    return cls
+
+
+class Renderer:
+    """
+    Common behaviour of all renderers.
+
+    An engine subclasses Renderer, sets `name`, implements
+    add_text_to_pdf_page(), overrides add_text_to_document(s) when it can
+    share work between positions or guests, and is made available with
+    @register. The constructor takes (font_path, rendering, overlay,
+    png_options, overlay_cache); engines ignore what does not apply to them.
+
+    Every engine reads a position the same way: (x, y) is the top-left
+    corner of the name (its ascender line) in PDF points from the top-left
+    of the page, and font_size is in points. Engines are interchangeable
+    (see calibration.py) only because of this.
+
+    `overlays` lists the overlay modes a renderer supports; the first one is
+    used when no mode is requested. Renderers only index a document by page
+    number, so `doc` may also be a view onto one guest's pages of a larger
+    document.
+    """
+
+    name = None
+    overlays = ("image",)
+    # Guests the engine hands to add_text_to_documents at once
+    batch_size = 1
+    # Heavy modules imported on first use, which warm_up() can load ahead of time
+    modules = ()
+    # Whether the engine embeds whole fonts, which the engine subsets before saving
+    subset_fonts = False
+
+    def __init__(self, font_path, rendering="normal", overlay=None, png_options=None,
+                 overlay_cache=None):
+        if overlay is None:
+            overlay = self.overlays[0]
+        if overlay not in self.overlays:
+            raise ValueError(f"The {self.name} engine supports overlay modes: {', '.join(self.overlays)}")
+
+        self.font_path = font_path
+        self.rendering = rendering
+        self.overlay = overlay
+        # Pillow PNG encoder options for image overlays (e.g. compress_level)
+        self.png_options = png_options or {}
+        # OverlayCache shared across runs, for renderers that rasterise overlays
+        self.overlay_cache = overlay_cache
+
+    def add_text_to_documents(self, docs, texts, positions, color_rgb):
+        """Add each text to its document; renderers that can batch override this"""
+        for doc, text in zip(docs, texts):
+            self.add_text_to_document(doc, text, positions, color_rgb)
+
+    def add_text_to_document(self, doc, text, positions, color_rgb):
+        """Add `text` at every (page, x, y, font_size) position of `doc`"""
+        for pos in positions:
+            page_num, x, y, size = pos
+            self.add_text_to_pdf_page(doc[page_num], text, x, y, size, color_rgb)
+
+    def add_text_to_pdf_page(self, pdf_page, text, x, y, font_size, color_rgb):
+        raise NotImplementedError
+
+
+@register
+class WeasyPrintRenderer(Renderer):
+    """
+    Shape text with WeasyPrint (Pango/HarfBuzz) and overlay it on the page.
+
+    overlay="image" rasterises the WeasyPrint page and inserts it as a PNG;
+    overlay="vector" places the WeasyPrint page itself as a form XObject, so
+    the name stays sharp at any print size and nothing is rasterised.
+
+    The renderer is a long-lived render context: the font configuration and
+    the stylesheet (including the @font-face rule) are built once per batch,
+    and only the per-name HTML changes between renders. Names of many guests
+    are laid out together, one page each, so WeasyPrint's fixed cost per
+    render is shared by the whole batch. Each overlay page has the size of
+    the template page it covers and no margins, so names are positioned in
+    the template's own points.
+    """
+
+    name = "weasyprint"
+    overlays = ("image", "vector")
+    batch_size = 256
+    modules = ("weasyprint", "weasyprint.text.fonts")
+
+    def __init__(self, font_path, rendering="normal", overlay=None, png_options=None,
+                 overlay_cache=None):
+        # WeasyPrint lays out vector text, the rendering quality does not apply
+        super().__init__(font_path, rendering, overlay, png_options, overlay_cache)
+
+        # WeasyPrint pulls in Pango/cairo, so only import it when this engine is used
+        from weasyprint import CSS, HTML, __version__ as weasyprint_version
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.HTML = HTML
+
+        # Shared by every render: the font is loaded and registered only once
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(string=self.build_stylesheet(), font_config=self.font_config)
+
+        # Image overlays are rasterised, so skip subsetting the embedded font
+        self.write_options = {"full_fonts": self.overlay == "image"}
+
+        # Everything besides text, colour, placements and page size that
+        # affects the pixels; vector overlays are not cached
+        self.cache_context = None
+        if overlay_cache is not None and self.overlay == "image":
+            self.cache_context = (self.name, file_digest(font_path), weasyprint_version,
+                                  fitz.VersionBind)
+
+    def build_stylesheet(self):
+        """CSS shared by every overlay; sizes and positions go inline"""
+        return f"""
+            @font-face {{
+                font-family: "GujaratiFont";
+                src: url("{pathlib.Path(self.font_path).resolve().as_uri()}");
+            }}
+            @page {{
+                margin: 0;
+            }}
+            html, body {{
+                margin: 0; padding: 0;
+                background: transparent;
+            }}
+            .overlay {{
+                position: relative;
+                overflow: hidden;
+                page-break-after: always;
+            }}
+            .overlay:last-child {{
+                page-break-after: auto;
+            }}
+            .text {{
+                position: absolute;
+                font-family: "GujaratiFont", sans-serif;
+                white-space: pre;
+            }}
+        """
+
+    def build_html(self, overlays):
+        """
+        HTML with one page per overlay. Each overlay is (page_size, names):
+        the (width, height) in points of the template page it covers, and
+        the names to put on it as (text, x, y, font_size, color_rgb).
+
+        Each .overlay block fills a named page of its template page's size,
+        and the names are absolutely positioned inside it, so each lands on
+        its own page exactly as when it is rendered alone.
+        """
+        # Named @page rule per distinct page size
+        page_names = {}
+        pages = []
+        for (width, height), names in overlays:
+            page_name = page_names.setdefault((width, height), f"size{len(page_names)}")
+            divs = []
+            for text, x, y, font_size, color_rgb in names:
+                text_style = (f"left: {x}pt; top: {y}pt; "
+                              f"font-size: {font_size}pt; color: {css_color(color_rgb)};")
+                divs.append(f'<div class="text" style="{text_style}">{html.escape(text)}</div>')
+            overlay_style = f"page: {page_name}; width: {width}pt; height: {height}pt;"
+            pages.append(f'<div class="overlay" style="{overlay_style}">{"".join(divs)}</div>')
+
+        page_rules = "".join(f"@page {page_name} {{ size: {width}pt {height}pt; }}"
+                             for (width, height), page_name in page_names.items())
+        return ('<html><head><meta charset="utf-8" />'
+                f'<style>{page_rules}</style></head><body>'
+                + "".join(pages) + '</body></html>')
+
+    def write_pdf(self, html_content):
+        """Render HTML -> PDF bytes with the shared font configuration and stylesheet"""
+        return self.HTML(string=html_content).write_pdf(
+            stylesheets=[self.stylesheet], font_config=self.font_config, **self.write_options)
+
+    def add_text_to_documents(self, docs, texts, positions, color_rgb):
+        """
+        Lay out the names of many documents in a single WeasyPrint render.
+        An overlay that repeats within a document up to a whole-point offset
+        (e.g. the same name on the cover and the RSVP card) is laid out once
+        and embedded once.
+        """
+        by_page = group_by_page(positions)
+
+        # One overlay per (document, template page), holding all its names
+        overlays = []
+        for doc, text in zip(docs, texts):
+            shared = {}
+            for page_num, placements in by_page.items():
+                overlays.append((doc[page_num], text, placements, shared))
+
+        self.add_overlays(overlays, color_rgb)
+
+    def add_text_to_document(self, doc, text, positions, color_rgb):
+        self.add_text_to_documents([doc], [text], positions, color_rgb)
+
+    def add_text_to_pdf_page(self, pdf_page, text, x, y, font_size, color_rgb):
+        """
+        Add Gujarati text to PDF correctly using WeasyPrint (handles shaping like 'શ્રી').
+        Works directly with PyMuPDF (fitz) page object.
+        """
+        self.add_overlays([(pdf_page, text, [(x, y, font_size)], None)], color_rgb)
+
+    def add_overlays(self, overlays, color_rgb):
+        """
+        Put overlays, given as (pdf_page, text, placements, shared), on their
+        pages. Every distinct overlay is laid out once, all in one WeasyPrint
+        pass; image overlays found in the on-disk overlay cache are not laid
+        out at all. `shared` maps the overlays already inserted in the same
+        document to their image xrefs, as in PillowRenderer.add_overlay, or
+        is None.
+        """
+        # Overlay key -> (overlay page number, offset it was laid out at)
+        layout = {}
+        # Overlay key -> rasterised image overlay, see rasterise_overlay
+        images = {}
+        pages = []
+        keyed = []
+        for pdf_page, text, placements, shared in overlays:
+            key, offset = overlay_key(text, placements, color_rgb)
+            # Vector overlays cover the whole page, so its size is part of the overlay
+            key += (page_size(pdf_page),)
+            keyed.append((pdf_page, key, offset, shared))
+            if key in layout or key in images:
+                continue
+            cached = self.cached_image(key)
+            if cached is not None:
+                images[key] = cached
+                continue
+            layout[key] = (len(pages), offset)
+            pages.append((page_size(pdf_page),
+                          [(text, x, y, size, color_rgb) for x, y, size in placements]))
+
+        overlay_doc = None
+        if pages:
+            # Render HTML -> PDF (WeasyPrint)
+            with stage("build_html"):
+                html_content = self.build_html(pages)
+            with stage("write_pdf"):
+                pdf_bytes = self.write_pdf(html_content)
+
+            # Open the overlays as PyMuPDF document, one page per overlay
+            with stage("overlay_open"):
+                overlay_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            if overlay_doc is not None and len(overlay_doc) != len(pages):
+                raise RuntimeError(f"WeasyPrint produced {len(overlay_doc)} pages "
+                                   f"for {len(pages)} overlays")
+
+            # Image overlays are rasterised once per key, then inserted once per document
+            for pdf_page, key, offset, shared in keyed:
+                if self.overlay == "vector":
+                    page_number, layout_offset = layout[key]
+                    # PyMuPDF embeds a page shown again in the same document only once
+                    self.show_overlay(pdf_page, overlay_doc, page_number, offset - layout_offset)
+                    continue
+
+                if shared is not None and key in shared:
+                    self.reuse_image(pdf_page, shared[key], offset)
+                    continue
+                if key not in images:
+                    page_number, layout_offset = layout[key]
+                    images[key] = self.rasterise_overlay(overlay_doc[page_number], pdf_page,
+                                                         layout_offset)
+                    self.store_image(key, images[key])
+                inserted = self.insert_image(pdf_page, images[key], offset)
+                if shared is not None:
+                    shared[key] = inserted
+        finally:
+            if overlay_doc is not None:
+                overlay_doc.close()
+
+    def cached_image(self, key):
+        """The rasterised overlay for `key` from the on-disk overlay cache, or None"""
+        if self.cache_context is None:
+            return None
+        with stage("cache_get"):
+            cached = self.overlay_cache.get(make_key(self.cache_context, key))
+        if cached is None:
+            return None
+        return [(fitz.Rect(rect), png_bytes) for rect, png_bytes in cached]
+
+    def store_image(self, key, images):
+        """Keep a freshly rasterised overlay in the on-disk overlay cache"""
+        if self.cache_context is None or not images:
+            return
+        with stage("cache_put"):
+            self.overlay_cache.put(make_key(self.cache_context, key),
+                                   [(tuple(rect), png_bytes) for rect, png_bytes in images])
+
+    def show_overlay(self, pdf_page, overlay_doc, page_number, shift):
+        """Stamp an overlay page over `pdf_page` as vector content (form XObject), moved by `shift`"""
+        with stage("show_pdf_page"):
+            pdf_page.show_pdf_page(pdf_page.rect + (shift.x, shift.y, shift.x, shift.y),
+                                   overlay_doc, page_number, keep_proportion=False, overlay=True)
+
+    def rasterise_overlay(self, overlay_page, pdf_page, layout_offset):
+        """
+        Rasterise what WeasyPrint drew on `overlay_page` into PNGs, one per
+        group of names close together (see cluster_rects), returning
+        [(rect relative to `layout_offset`, png_bytes), ...], empty when it
+        is blank
+        """
+        # Only the areas WeasyPrint actually drew on need rasterising. Boxes
+        # are rounded out to whole points first, so separate groups never
+        # share a pixel.
+        item_rects = [fitz.Rect(fitz.Rect(item_rect).irect) & overlay_page.rect
+                      for _, item_rect in overlay_page.get_bboxlog()]
+        item_rects = [item_rect for item_rect in item_rects if not item_rect.is_empty]
+
+        # Cover the target page exactly, should WeasyPrint round the page size
+        stretch = fitz.Matrix(pdf_page.rect.width / overlay_page.rect.width,
+                              pdf_page.rect.height / overlay_page.rect.height)
+        shift = (layout_offset.x, layout_offset.y, layout_offset.x, layout_offset.y)
+
+        images = []
+        for bbox, _ in cluster_rects(item_rects):
+            # Render that box of the overlay page to PNG (to preserve complex text correctly)
+            with stage("get_pixmap"):
+                pix = overlay_page.get_pixmap(alpha=True, clip=bbox)
+            with stage("png_encode"):
+                img_bytes = pix.tobytes("png")
+            images.append((bbox * stretch - shift, img_bytes))
+        return images
+
+    def insert_image(self, pdf_page, images, offset):
+        """Insert a rasterised overlay at `offset`, returning [(xref, rect), ...] for reuse_image"""
+        inserted = []
+        for rect, img_bytes in images:
+            with stage("insert_image"):
+                xref = pdf_page.insert_image(rect + (offset.x, offset.y, offset.x, offset.y),
+                                             stream=img_bytes, keep_proportion=False, overlay=True)
+            inserted.append((xref, rect))
+        return inserted
+
+    def reuse_image(self, pdf_page, reused, offset):
+        """Show images already embedded in the document at `offset`"""
+        for xref, rect in reused:
+            with stage("insert_image"):
+                pdf_page.insert_image(rect + (offset.x, offset.y, offset.x, offset.y), xref=xref,
+                                      keep_proportion=False, overlay=True)
+
+
+@register
+class PillowRenderer(Renderer):
+    """Shape text with Pillow + Raqm and overlay it on the page as an image"""
+
+    name = "pillow"
+    overlays = ("image",)
+
+    def __init__(self, font_path, rendering="normal", overlay=None, png_options=None,
+                 overlay_cache=None):
+        super().__init__(font_path, rendering, overlay, png_options, overlay_cache)
+        self.font_identity = font_identity(font_path)
+        self.scale = 3 if rendering == "quality" else 2
+
+        # Everything besides text, colour and placements that affects the pixels
+        self.cache_context = None
+        if overlay_cache is not None:
+            self.cache_context = (self.name, file_digest(font_path), self.scale,
+                                  PIL.features.check_feature("raqm"), PIL.__version__,
+                                  sorted(self.png_options.items()))
+
+    def add_text_to_document(self, doc, text, positions, color_rgb):
+        """Add `text` at every position, with one overlay per page"""
+        # Identical overlays within this document share one image
+        shared = {}
+        for page_num, placements in group_by_page(positions).items():
+            self.add_overlay(doc[page_num], text, placements, color_rgb, shared)
+
+    def add_text_to_pdf_page(self, pdf_page, text, x, y, font_size, color_rgb):
+        """Add text to PDF using image overlay method with proper text shaping for Gujarati"""
+        self.add_overlay(pdf_page, text, [(x, y, font_size)], color_rgb)
+
+    def add_overlay(self, pdf_page, text, placements, color_rgb, shared=None):
+        """
+        Render and insert one page's overlay. `shared` maps overlays already
+        inserted in the same document to their image xrefs, so a repeat (e.g.
+        the same name on the cover and the RSVP card) is neither rendered
+        nor embedded again.
+        """
+        key, offset = overlay_key(text, placements, color_rgb)
+
+        if shared is not None and key in shared:
+            for xref, rect in shared[key]:
+                with stage("insert_image"):
+                    pdf_page.insert_image(rect + (offset.x, offset.y, offset.x, offset.y),
+                                          xref=xref, overlay=True)
+            return
+
+        # Insert each image into PDF over its text's bounding box only
+        reused = []
+        for rect, png_bytes in self.cached_overlay(key, offset, text, placements, color_rgb):
+            with stage("insert_image"):
+                xref = pdf_page.insert_image(rect, stream=png_bytes, overlay=True)
+            reused.append((xref, rect - (offset.x, offset.y, offset.x, offset.y)))
+        if shared is not None:
+            shared[key] = reused
+
+    def cached_overlay(self, key, offset, text, placements, color_rgb):
+        """render_overlay, going through the on-disk overlay cache when there is one"""
+        if self.overlay_cache is None:
+            return self.render_overlay(text, placements, color_rgb)
+
+        shift = (offset.x, offset.y, offset.x, offset.y)
+        disk_key = make_key(self.cache_context, key)
+        with stage("cache_get"):
+            cached = self.overlay_cache.get(disk_key)
+        if cached is not None:
+            return [(fitz.Rect(rect) + shift, png_bytes) for rect, png_bytes in cached]
+
+        overlay = self.render_overlay(text, placements, color_rgb)
+        if overlay:
+            with stage("cache_put"):
+                self.overlay_cache.put(disk_key, [(tuple(rect - shift), png_bytes)
+                                                  for rect, png_bytes in overlay])
+        return overlay
+
+    def render_overlay(self, text, placements, color_rgb):
+        """
+        Render text at every (x, y, font_size) placement of one page into
+        PNGs that cover only the placements' bounding boxes: one for
+        placements close together, and one each for those far apart (see
+        cluster_rects).
+
+        Returns [(rect, png_bytes), ...] with each `rect` in page coordinates,
+        empty when there is nothing to draw.
+        """
+        # Increase resolution for better quality
+        scale = self.scale
+
+        # Measure the shaped text at every placement before drawing anything
+        with stage("shape"):
+            features = ['-liga', '-clig']
+            draws = []
+            rects = []
+            for x, y, font_size in placements:
+                # Load font with scaled size (parsed once per size, not per position)
+                font = load_truetype(self.font_identity, font_size, scale, ImageFont.Layout.RAQM)
+                try:
+                    # Use proper text layout for complex scripts
+                    left, top, right, bottom = font.getbbox(text, features=features)
+                except:
+                    # Basic layout does not support font features
+                    features = None
+                    left, top, right, bottom = font.getbbox(text)
+                if right <= left or bottom <= top:
+                    continue
+
+                # Snap the box outwards to whole points so the downscaled pixels sit
+                # on the same grid as a full-page image would. The box also takes in
+                # the draw origin, as Pillow places text drawn at a negative
+                # fractional position differently.
+                origin_x, origin_y = x * scale, y * scale
+                rects.append(fitz.Rect(
+                    math.floor(min(origin_x, origin_x + left) / scale) - OVERLAY_MARGIN,
+                    math.floor(min(origin_y, origin_y + top) / scale) - OVERLAY_MARGIN,
+                    math.ceil((origin_x + right) / scale) + OVERLAY_MARGIN,
+                    math.ceil((origin_y + bottom) / scale) + OVERLAY_MARGIN))
+                draws.append((origin_x, origin_y, font))
+
+        images = []
+        for rect, members in cluster_rects(rects):
+            width, height = int(rect.width), int(rect.height)
+
+            with stage("draw"):
+                # Create transparent image for the box only, at higher resolution
+                text_img = Image.new('RGBA', (width * scale, height * scale), (255, 255, 255, 0))
+                draw = ImageDraw.Draw(text_img)
+
+                # Draw text relative to the box with proper text shaping
+                for origin_x, origin_y, font in (draws[index] for index in members):
+                    position = (origin_x - rect.x0 * scale, origin_y - rect.y0 * scale)
+                    if features:
+                        draw.text(position, text, font=font, fill=color_rgb, features=features)
+                    else:
+                        draw.text(position, text, font=font, fill=color_rgb)
+
+                # Resize back to page resolution with high-quality resampling
+                text_img = text_img.resize((width, height), Image.Resampling.LANCZOS)
+
+            # Convert PIL image to bytes
+            with stage("png_encode"):
+                img_buffer = io.BytesIO()
+                text_img.save(img_buffer, format='PNG', **self.png_options)
+            images.append((rect, img_buffer.getvalue()))
+        return images
+
+
+@register
+class NativeRenderer(Renderer):
+    """
+    Write the name into the page as real text using PyMuPDF's own HTML layout.
+
+    MuPDF shapes the text with HarfBuzz, so Gujarati conjuncts come out right
+    without WeasyPrint, Pango or Pillow. All names of a batch are laid out on
+    a single scratch PDF whose pages are then stamped onto the templates, so
+    the font is embedded once per document rather than once per position,
+    and once per batch when the guests share a combined document.
+    """
+
+    name = "native"
+    overlays = ("vector",)
+    batch_size = 64
+    # Story embeds the complete font file
+    subset_fonts = True
+
+    def __init__(self, font_path, rendering="normal", overlay=None, png_options=None,
+                 overlay_cache=None):
+        # Vector text, the rendering quality does not apply
+        super().__init__(font_path, rendering, overlay, png_options, overlay_cache)
+
+        # Story resolves the @font-face url against this archive
+        self.archive = fitz.Archive(os.path.dirname(os.path.abspath(font_path)))
+        self.font_url = os.path.basename(font_path)
+
+        # Names are moved so the baseline lies one ascender below y, where
+        # Pillow puts it; MuPDF's own line box puts it elsewhere
+        self.baseline_shift = fitz.Font(fontfile=font_path).ascender - self.measure_baseline()
+
+    def build_css(self, font_size, color_rgb):
+        r, g, b = color_rgb[:3]
+        return f"""
+            @font-face {{ font-family: GujaratiFont; src: url("{self.font_url}"); }}
+            body {{ margin: 0; padding: 0; }}
+            p {{
+                margin: 0;
+                font-family: GujaratiFont;
+                font-size: {font_size}pt;
+                color: #{r:02x}{g:02x}{b:02x};
+                white-space: pre;
+            }}
+        """
+
+    def measure_baseline(self):
+        """Distance in em from the top of a laid-out line to its baseline"""
+        buffer = io.BytesIO()
+        writer = fitz.DocumentWriter(buffer)
+        page_rect = fitz.Rect(0, 0, 200, 200)
+        story = fitz.Story(html="<p>ક</p>", user_css=self.build_css(100, (0, 0, 0)),
+                           archive=self.archive)
+        story.place(page_rect)
+        story.draw(writer.begin_page(page_rect))
+        writer.end_page()
+        writer.close()
+        with fitz.open("pdf", buffer.getvalue()) as doc:
+            for block in doc[0].get_text("dict")["blocks"]:
+                for line in block.get("lines", ()):
+                    return line["spans"][0]["origin"][1] / 100
+        raise RuntimeError("MuPDF drew no text with this font")
+
+    def draw_text(self, device, page_rect, text, x, y, font_size, color_rgb):
+        """Lay out one name with its top-left corner at (x, y)"""
+        story = fitz.Story(html=f"<p>{html.escape(text)}</p>",
+                           user_css=self.build_css(font_size, color_rgb), archive=self.archive)
+        # A page-sized box is always big enough for a single line
+        top = y + self.baseline_shift * font_size
+        story.place(fitz.Rect(x, top, x + page_rect.width, top + page_rect.height))
+        story.draw(device)
+
+    def add_text_to_documents(self, docs, texts, positions, color_rgb):
+        """Add each text to its document, laying out the whole batch in one scratch PDF"""
+        by_page = group_by_page(positions)
+
+        # One scratch page per (document, template page), holding all its names
+        with stage("layout"):
+            buffer = io.BytesIO()
+            writer = fitz.DocumentWriter(buffer)
+            for doc, text in zip(docs, texts):
+                for page_num, placements in by_page.items():
+                    page_rect = doc[page_num].rect
+                    device = writer.begin_page(page_rect)
+                    for x, y, size in placements:
+                        self.draw_text(device, page_rect, text, x, y, size, color_rgb)
+                    writer.end_page()
+            writer.close()
+
+        # Pages shown from the same source share its font object
+        with stage("overlay_open"):
+            overlay_doc = fitz.open("pdf", buffer.getvalue())
+        overlay_num = 0
+        with stage("show_pdf_page"):
+            for doc in docs:
+                for page_num in by_page:
+                    pdf_page = doc[page_num]
+                    pdf_page.show_pdf_page(pdf_page.rect, overlay_doc, overlay_num,
+                                           keep_proportion=False, overlay=True)
+                    overlay_num += 1
+        overlay_doc.close()
+
+    def add_text_to_document(self, doc, text, positions, color_rgb):
+        """Add `text` at every position, embedding the font once for the document"""
+        self.add_text_to_documents([doc], [text], positions, color_rgb)
+
+    def add_text_to_pdf_page(self, pdf_page, text, x, y, font_size, color_rgb):
+        """Add text to a single page as real (vector) text"""
+        self.add_text_to_document(pdf_page.parent, text, [(pdf_page.number, x, y, font_size)], color_rgb)
+
+
+def warm_up(engine):
+    """
+    Import the heavy modules behind `engine` ahead of its first use, e.g. on
+    a background thread once a window is showing; AUTO warms up every
+    engine, as the calibration tries them all. Import failures are left
+    for create_renderer() to report.
+    """
+    engines = list(RENDERERS) if engine == AUTO else [engine]
+    for name in engines:
+        for module in RENDERERS[name].modules:
+            try:
+                importlib.import_module(module)
+            except (ImportError, OSError):
+                break
+
+
+def create_renderer(engine, font_path, rendering="normal", overlay=None, png_options=None,
+                    overlay_cache=None):
+    """
+    Instantiate the renderer registered under `engine`. AUTO is resolved by
+    calibration.choose_engine() first, e.g. through InvitationEngine.
+    """
+    if engine not in RENDERERS:
+        raise ValueError(f"Unknown engine '{engine}' (choose from: {', '.join(RENDERERS)})")
+    return RENDERERS[engine](font_path, rendering, overlay, png_options, overlay_cache)
@@ -0,0 +1,29 @@
+import fitz  # PyMuPDF
+import pytest
+
+# MuPDF's script number for Gujarati (UCDN_SCRIPT_GUJARATI)
+GUJARATI_SCRIPT = 12
+
+
+@pytest.fixture(scope="session")
+def gujarati_font(tmp_path_factory):
+    """Path of the Noto Serif Gujarati font bundled with PyMuPDF"""
+    buffer = fitz.Font(script=GUJARATI_SCRIPT).buffer
+    if not buffer:
+        pytest.skip("this PyMuPDF build has no bundled Gujarati font")
+    path = tmp_path_factory.mktemp("fonts") / "NotoSerifGujarati-Regular.ttf"
+    path.write_bytes(buffer)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def template_pdf(tmp_path_factory):
+    """A two-page A5 invitation template"""
+    doc = fitz.open()
+    for title in ("Wedding Invitation", "RSVP"):
+        page = doc.new_page(width=420, height=595)
+        page.insert_text((60, 80), title, fontsize=24)
+    path = tmp_path_factory.mktemp("templates") / "template.pdf"
+    doc.save(path)
+    doc.close()
+    return str(path)
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from invitation_engine import InvitationEngine, count_rows, iter_guest_names, make_batches
+
+GUESTS = ["શ્રી રાજેશભાઈ પટેલ", "શ્રીમતી સીતાબેન શાહ", "John Doe", "ક્ષમા જ્ઞાની", "Ravi"]
+POSITIONS = [(0, 60, 200, 24), (1, 40, 120, 18)]
+
+
+def make_engine(template_pdf, font, engine, **options):
+    return InvitationEngine(template_pdf, font, POSITIONS, engine=engine,
+                            overlay_cache=False, **options)
+
+
+@pytest.mark.parametrize("engine", ["native", "pillow"])
+def test_parallel_output_matches_serial(template_pdf, gujarati_font, tmp_path, engine):
+    invitations = make_engine(template_pdf, gujarati_font, engine)
+    serial = invitations.generate(GUESTS, tmp_path / "serial", workers=1, batch_size=2)
+    parallel = invitations.generate(GUESTS, tmp_path / "parallel", workers=2, batch_size=2)
+
+    assert [os.path.basename(path) for path in serial] == \
+        [os.path.basename(path) for path in parallel]
+    for serial_path, parallel_path in zip(serial, parallel):
+        with open(serial_path, 'rb') as a, open(parallel_path, 'rb') as b:
+            assert a.read() == b.read()
+
+
+def test_clashing_file_names_get_numbers(template_pdf, gujarati_font, tmp_path):
+    invitations = make_engine(template_pdf, gujarati_font, "native")
+    paths = invitations.generate(["John Doe", "John  Doe", "john doe", "John/Doe"], tmp_path)
+
+    assert [os.path.basename(path) for path in paths] == [
+        "invitation_John_Doe.pdf", "invitation_John_Doe_2.pdf",
+        "invitation_john_doe_3.pdf", "invitation_JohnDoe.pdf"]
+
+
+
+def test_name_separator(template_pdf, gujarati_font, tmp_path):
+    spaces = make_engine(template_pdf, gujarati_font, "native", name_separator=" ")
+    underscores = make_engine(template_pdf, gujarati_font, "native")
+
+    assert os.path.basename(spaces.output_path_for(tmp_path, "શ્રી રાજેશભાઈ  પટેલ")) == \
+        "invitation_શ્રી રાજેશભાઈ પટેલ.pdf"
+    assert os.path.basename(underscores.output_path_for(tmp_path, "શ્રી રાજેશભાઈ  પટેલ")) == \
+        "invitation_શ્રી_રાજેશભાઈ_પટેલ.pdf"
+
+
+def test_make_batches():
+    tasks = ((index, f"Guest {index}", None) for index in range(7))
+    batches = list(make_batches(tasks, 3))
+
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert [task[0] for batch in batches for task in batch] == list(range(7))
+    assert list(make_batches([], 3)) == []
+    assert [len(batch) for batch in make_batches(range(2), 0)] == [1, 1]
+
+
+def test_make_batches_is_lazy():
+    pulled = []
+
+    def tasks():
+        for index in range(10):
+            pulled.append(index)
+            yield index
+
+    batches = make_batches(tasks(), 4)
+    next(batches)
+    assert pulled == [0, 1, 2, 3]
+
+
+def write_csv(tmp_path, data):
+    path = tmp_path / "guests.csv"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_guest_names_skip_malformed_rows(tmp_path):
+    csv_path = write_csv(tmp_path, "city,name\n"
+                                   "Surat,શ્રી રાજેશભાઈ પટેલ\n"
+                                   "Vadodara\n"
+                                   "\n"
+                                   "Rajkot,   \n"
+                                   'Anand,"Shah, Sita"\n'.encode("utf-8")
+                         + b"Nadiad,\xff\xfeKamal\n"
+                         + "Ahmedabad,John Doe".encode("utf-8"))
+    malformed = []
+    names = list(iter_guest_names(csv_path, on_malformed=lambda line, message:
+                                  malformed.append((line, message))))
+
+    assert names == ["શ્રી રાજેશભાઈ પટેલ", "Shah, Sita", "John Doe"]
+    assert [line for line, _ in malformed] == [3, 5, 7]
+    assert "UTF-8" in malformed[2][1]
+    assert count_rows(csv_path) == 7
+
+
+def test_guest_names_strip_the_byte_order_mark(tmp_path):
+    csv_path = write_csv(tmp_path, "\ufeffname\nRavi\nશ્રીમતી સીતાબેન શાહ\n".encode("utf-8"))
+    assert list(iter_guest_names(csv_path)) == ["Ravi", "શ્રીમતી સીતાબેન શાહ"]
+    assert count_rows(csv_path) == 2
+
+
+@pytest.mark.parametrize("data", [b"", b"guest\nRavi\n"])
+def test_guest_names_need_a_name_column(tmp_path, data):
+    with pytest.raises(ValueError):
+        list(iter_guest_names(write_csv(tmp_path, data)))
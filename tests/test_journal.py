@@ -0,0 +1,75 @@
+import json
+import os
+
+from invitation_engine import InvitationEngine
+from journal import JOURNAL_NAME, JOURNAL_VERSION, CompletionJournal
+
+POSITIONS = [(0, 60, 200, 24)]
+
+
+def write_invitation(directory, name, data=b"%PDF-1.7 test"):
+    path = directory / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_record_and_reload(tmp_path):
+    output_path = write_invitation(tmp_path, "invitation_Ravi.pdf")
+    journal = CompletionJournal(tmp_path)
+    journal.record(output_path, "key-1", "Ravi")
+    journal.close()
+
+    journal = CompletionJournal(tmp_path)
+    assert journal.is_done(output_path, "key-1")
+    assert not journal.is_done(output_path, "key-2")
+    assert not journal.is_done(str(tmp_path / "invitation_Kamal.pdf"), "key-1")
+
+
+def test_changed_or_missing_files_are_not_done(tmp_path):
+    output_path = write_invitation(tmp_path, "invitation_Ravi.pdf")
+    journal = CompletionJournal(tmp_path)
+    journal.record(output_path, "key-1", "Ravi")
+    journal.close()
+
+    write_invitation(tmp_path, "invitation_Ravi.pdf", b"%PDF cut sho")
+    assert not CompletionJournal(tmp_path).is_done(output_path, "key-1")
+    os.remove(output_path)
+    assert not CompletionJournal(tmp_path).is_done(output_path, "key-1")
+
+
+def test_damaged_and_stale_lines_are_dropped(tmp_path):
+    ravi = write_invitation(tmp_path, "invitation_Ravi.pdf")
+    kamal = write_invitation(tmp_path, "invitation_Kamal.pdf")
+    entry = {"version": JOURNAL_VERSION, "file": "invitation_Ravi.pdf", "name": "Ravi",
+             "key": "key-1", "size": os.path.getsize(ravi)}
+    old = dict(entry, file="invitation_Kamal.pdf", name="Kamal", version=JOURNAL_VERSION - 1)
+    lines = [json.dumps(entry), "not json", json.dumps({"file": "x"}), "[1, 2]",
+             json.dumps(old), json.dumps(entry)[:20]]
+    (tmp_path / JOURNAL_NAME).write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    journal = CompletionJournal(tmp_path)
+    assert journal.is_done(ravi, "key-1")
+    assert not journal.is_done(kamal, "key-1")
+    # Compacted down to the one good line
+    assert (tmp_path / JOURNAL_NAME).read_text(encoding="utf-8").splitlines() == [json.dumps(entry)]
+
+
+def test_generate_resumes(template_pdf, gujarati_font, tmp_path):
+    guests = ["Ravi", "Kamal", "શ્રી રાજેશભાઈ પટેલ"]
+    invitations = InvitationEngine(template_pdf, gujarati_font, POSITIONS, overlay_cache=False)
+    first = invitations.generate(guests, tmp_path)
+    os.remove(first[1])
+
+    reused = []
+    second = invitations.generate(guests + ["Sita"], tmp_path,
+                                  on_reused=lambda index, guest_name: reused.append(index))
+    assert reused == [0, 2]
+    assert second[:3] == first
+    assert all(os.path.exists(path) for path in second)
+
+    # Other settings make every invitation new
+    reused.clear()
+    recoloured = InvitationEngine(template_pdf, gujarati_font, POSITIONS, color="maroon",
+                                  overlay_cache=False)
+    recoloured.generate(guests, tmp_path, on_reused=lambda index, guest_name: reused.append(index))
+    assert reused == []
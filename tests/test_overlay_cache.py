@@ -0,0 +1,67 @@
+import os
+
+from overlay_cache import HEADER, STATS_NAME, OverlayCache, make_key
+
+IMAGES = [((1.0, 2.0, 30.5, 40.0), b"first png"), ((100.0, 2.0, 130.0, 40.0), b"second")]
+
+
+def entry_size(images):
+    return sum(HEADER.size + len(png_bytes) for _, png_bytes in images)
+
+
+def test_put_and_get(tmp_path):
+    cache = OverlayCache(tmp_path)
+    key = make_key("pillow", "Ravi")
+    assert cache.get(key) is None
+
+    cache.put(key, IMAGES)
+    assert cache.get(key) == IMAGES
+    assert cache.take_stats() == (1, 1, entry_size(IMAGES))
+
+
+def test_damaged_entries_miss(tmp_path):
+    cache = OverlayCache(tmp_path)
+    key = make_key("pillow", "Ravi")
+    cache.put(key, IMAGES)
+
+    with open(cache.entry_path(key), 'r+b') as f:
+        f.truncate(entry_size(IMAGES) - 1)
+    assert cache.get(key) is None
+    with open(cache.entry_path(key), 'wb') as f:
+        f.write(b"short")
+    assert cache.get(key) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    image = [((0.0, 0.0, 10.0, 10.0), b"x" * 1000)]
+    cache = OverlayCache(tmp_path, max_bytes=entry_size(image) * 3)
+    keys = [make_key("pillow", name) for name in ("a", "b", "c", "d")]
+    for age, key in enumerate(keys[:3]):
+        cache.put(key, image)
+        os.utime(cache.entry_path(key), (age, age))
+    cache.get(keys[0])  # now the most recently used
+
+    # Evicts down to 90% of the budget: the two oldest entries go
+    cache.put(keys[3], image)
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, True]
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_running_size_is_kept_in_the_stats_log(tmp_path):
+    cache = OverlayCache(tmp_path)
+    cache.put(make_key("a"), IMAGES)
+    cache.flush_stats()
+
+    # Another run reads the total instead of scanning and adds its own writes
+    cache = OverlayCache(tmp_path)
+    cache.put(make_key("b"), IMAGES[:1])
+    assert cache._size == entry_size(IMAGES) + entry_size(IMAGES[:1])
+    cache.add_stats(2, 1, 100)
+    cache.flush_stats()
+    hits, misses, size, lines = cache.read_stats()
+    assert (hits, misses, size) == (2, 1, entry_size(IMAGES) + entry_size(IMAGES[:1]) + 100)
+
+    # cache-stats sets the total back to what is on disk
+    stats = cache.stats()
+    assert stats["bytes"] == entry_size(IMAGES) + entry_size(IMAGES[:1])
+    assert (tmp_path / STATS_NAME).read_text().split() == ["2", "1", str(stats["bytes"])]
@@ -0,0 +1,56 @@
+import io
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+from renderers import PillowRenderer, load_truetype
+
+PAGE_SIZE = (400, 300)
+BLACK = (0, 0, 0, 255)
+
+
+def full_page_overlay(renderer, text, placements):
+    """The overlay as a page-sized image, drawn the way it was before cropping"""
+    scale = renderer.scale
+    width, height = PAGE_SIZE
+    img = Image.new('RGBA', (width * scale, height * scale), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(img)
+    for x, y, font_size in placements:
+        font = load_truetype(renderer.font_identity, font_size, scale, ImageFont.Layout.RAQM)
+        try:
+            draw.text((x * scale, y * scale), text, font=font, fill=BLACK, features=['-liga', '-clig'])
+        except Exception:
+            draw.text((x * scale, y * scale), text, font=font, fill=BLACK)
+    return img.resize(PAGE_SIZE, Image.Resampling.LANCZOS)
+
+
+def on_white(img):
+    return Image.alpha_composite(Image.new('RGBA', img.size, (255, 255, 255, 255)), img).convert("L")
+
+
+@pytest.mark.parametrize("placements", [
+    [(100, 200, 32)],
+    [(100.3, 200.7, 32)],
+    [(50.5, 20.25, 18), (120.9, 150.1, 24)],
+    [(10.5, 10, 18), (220, 250.5, 18)],
+])
+@pytest.mark.parametrize("text", ["શ્રી રાજેશભાઈ પટેલ", "Kamal"])
+def test_pillow_overlay_matches_full_page(gujarati_font, text, placements):
+    renderer = PillowRenderer(gujarati_font)
+
+    page = Image.new('RGBA', PAGE_SIZE, (255, 255, 255, 0))
+    for rect, png_bytes in renderer.render_overlay(text, placements, BLACK):
+        page.paste(Image.open(io.BytesIO(png_bytes)).convert("RGBA"), (int(rect.x0), int(rect.y0)))
+    difference = ImageChops.difference(on_white(page), on_white(full_page_overlay(renderer, text, placements)))
+    assert difference.getextrema()[1] <= 1
+
+
+def test_pillow_overlay_splits_far_apart_placements(gujarati_font):
+    renderer = PillowRenderer(gujarati_font)
+    near = renderer.render_overlay("Kamal", [(50, 20, 18), (50, 45, 18)], BLACK)
+    far = renderer.render_overlay("Kamal", [(10, 10, 18), (320, 250, 18)], BLACK)
+
+    assert len(near) == 1
+    assert len(far) == 2
+    area = sum(abs(rect) for rect, _ in far)
+    assert area < PAGE_SIZE[0] * PAGE_SIZE[1] / 10
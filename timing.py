@@ -0,0 +1,143 @@
+"""
+Lightweight per-stage timers for the render pipeline.
+
+Hot stages are wrapped in ``with stage("get_pixmap"):``. The time spent is
+added to per-process totals keyed by the path of the enclosing stages
+(e.g. "render/get_pixmap"). The engine takes the totals after every batch
+(take()), also from worker processes, and a TimingReport sums them into a
+summary table. A stage costs two clock reads and a dict update; the
+individual events for a Chrome trace-event file (chrome://tracing,
+Perfetto) are only kept after set_tracing(True).
+"""
+import json
+import os
+import threading
+import time
+
+# Stage path -> [nanoseconds, calls] since the last take()
+_totals = {}
+
+# (path, start ns, duration ns, thread id) per finished stage while tracing, else None
+_events = None
+
+# Each thread's stack of open stage paths
+_local = threading.local()
+
+
+class _Stage:
+    __slots__ = ("name", "path", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = f"{stack[-1]}/{self.name}" if stack else self.name
+        stack.append(self.path)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter_ns() - self.start
+        _local.stack.pop()
+        total = _totals.get(self.path)
+        if total is None:
+            _totals[self.path] = [duration, 1]
+        else:
+            total[0] += duration
+            total[1] += 1
+        if _events is not None:
+            _events.append((self.path, self.start, duration, threading.get_native_id()))
+        return False
+
+
+def stage(name):
+    """Context manager timing one stage, nested under any stage already open"""
+    return _Stage(name)
+
+
+def set_tracing(enabled=True):
+    """Start or stop keeping every stage as a trace event in this process"""
+    global _events
+    if not enabled:
+        _events = None
+    elif _events is None:
+        _events = []
+
+
+def tracing():
+    return _events is not None
+
+
+def take():
+    """
+    Return the stage times gathered since the last call and start afresh,
+    as a picklable dict: {"pid", "stages": {path: (seconds, calls)}} plus
+    "events" while tracing
+    """
+    global _totals
+    totals, _totals = _totals, {}
+    times = {
+        "pid": os.getpid(),
+        "stages": {path: (nanoseconds / 1e9, calls) for path, (nanoseconds, calls) in totals.items()},
+    }
+    if _events is not None:
+        times["events"] = _events[:]
+        _events.clear()
+    return times
+
+
+class TimingReport:
+    """Stage times of a whole run, summed over every batch and process"""
+
+    def __init__(self):
+        self.stages = {}  # path -> [seconds, calls]
+        self.events = []  # (pid, path, start ns, duration ns, thread id)
+        self.batches = 0
+
+    def add(self, times):
+        """Add the result of one take(), e.g. as generate()'s on_stage_times"""
+        self.batches += 1
+        for path, (seconds, calls) in times["stages"].items():
+            total = self.stages.setdefault(path, [0.0, 0])
+            total[0] += seconds
+            total[1] += calls
+        for event in times.get("events", ()):
+            self.events.append((times["pid"],) + tuple(event))
+
+    def summary(self, guests=None):
+        """Table of every stage, nested stages indented under their parent"""
+        top_level = sum(seconds for path, (seconds, _) in self.stages.items() if "/" not in path)
+        header = f"{'stage':<28}{'calls':>8}{'total s':>10}{'ms/call':>10}{'share':>8}"
+        if guests:
+            header += f"{'ms/guest':>10}"
+        lines = [header]
+        for path in sorted(self.stages, key=lambda path: path.split("/")):
+            seconds, calls = self.stages[path]
+            depth = path.count("/")
+            label = "  " * depth + path.rsplit("/", 1)[-1]
+            share = seconds / top_level * 100 if top_level else 0.0
+            line = (f"{label:<28}{calls:>8}{seconds:>10.3f}{seconds * 1000 / calls:>10.2f}"
+                    f"{share:>7.1f}%")
+            if guests:
+                line += f"{seconds * 1000 / guests:>10.2f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        """Write the traced stages as Chrome trace-event JSON"""
+        origin = min((start for _, _, start, _, _ in self.events), default=0)
+        events = [{
+            "name": stage_path.rsplit("/", 1)[-1],
+            "cat": "render",
+            "ph": "X",
+            "ts": (start - origin) / 1000,
+            "dur": duration / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": {"stage": stage_path},
+        } for pid, stage_path, start, duration, tid in self.events]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)